@@ -13,15 +13,14 @@ login_manager = LoginManager()
 bcrypt = Bcrypt()
 csrf = CSRFProtect()
 
-@login_manager.user_loader
-def load_user(user_id):
-    from app.models import User
-    return User.query.get(int(user_id))
-
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Instrument requests and SQL before any other before_request hooks
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+
     # Initialize Flask extensions with app
     db.init_app(app)
     migrate.init_app(app, db)
@@ -34,6 +33,10 @@ def create_app(config_class=Config):
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
 
+    # Hash and verify passwords on a bounded thread pool
+    from app.utils.passwords import password_hasher
+    password_hasher.init_app(app)
+
     # Add template context processor for current date
     @app.context_processor
     def inject_now():
@@ -58,10 +61,38 @@ def create_app(config_class=Config):
     from app.api.devices import bp as devices_api_bp
     from app.api.sales import bp as sales_api_bp
     from app.api.reports import bp as reports_api_bp
+    from app.api.sync import bp as sync_api_bp
     
     app.register_blueprint(auth_api_bp, url_prefix='/api/auth', name='api_auth')
     app.register_blueprint(devices_api_bp, url_prefix='/api/devices', name='api_devices')
     app.register_blueprint(sales_api_bp, url_prefix='/api/sales', name='api_sales')
     app.register_blueprint(reports_api_bp, url_prefix='/api/reports', name='api_reports')
+    app.register_blueprint(sync_api_bp, url_prefix='/api/sync', name='api_sync')
+
+    # Keep the daily sales rollup in step with sale writes
+    from app.utils.rollups import init_rollups
+    init_rollups(app)
+
+    # Full-text search over devices
+    from app.utils.search import init_search
+    init_search(app)
+
+    # Device tombstones for terminal delta sync
+    from app.utils.sync import init_sync
+    init_sync(app)
+
+    # Cache report results, user rows and IMEI lookups until the underlying data changes
+    from app.utils.cache import report_cache, user_cache, device_cache
+    report_cache.init_app(app)
+    user_cache.init_app(app)
+    device_cache.init_app(app)
+
+    # Stateless API tokens and their revocation set
+    from app.utils.tokens import init_tokens
+    init_tokens(app)
+
+    # Buffer last_seen updates and write them in batches
+    from app.utils.activity import last_seen_buffer
+    last_seen_buffer.init_app(app)
 
     return app
\ No newline at end of file
@@ -1,25 +1,12 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models import User
-from app import db, bcrypt
-import jwt
-from datetime import datetime, timedelta
+from app import db, bcrypt, csrf
+from app.utils.activity import last_seen_buffer
+from app.utils.tokens import TokenUser, generate_token, decode_token, bearer_token, revocations
 
 bp = Blueprint('api_auth', __name__)
 
-def generate_token(user):
-    """Generate JWT token for user"""
-    payload = {
-        'user_id': user.id,
-        'exp': datetime.utcnow() + timedelta(hours=1),
-        'iat': datetime.utcnow()
-    }
-    return jwt.encode(
-        payload,
-        current_app.config['JWT_SECRET_KEY'],
-        algorithm='HS256'
-    )
-
 @bp.route('/login', methods=['POST'])
 def login():
     """Login endpoint that returns JWT token"""
@@ -36,18 +23,25 @@ def login():
     if not user.is_active:
         return jsonify({'error': 'Account is deactivated'}), 401
     
-    # Update last seen
-    user.last_seen = datetime.utcnow()
-    db.session.commit()
+    # Bring the stored hash up to the configured bcrypt cost
+    if user.rehash_password(data['password']):
+        db.session.commit()
+    
+    # Update last seen; written in the background with other pending updates
+    last_seen_buffer.touch(user.id)
     
-    # Generate token
+    # Generate tokens
     token = generate_token(user)
+    refresh_token = generate_token(user, 'refresh')
     
-    # Login user for session-based auth as well
-    login_user(user)
+    # Login user for session-based auth as well, unless the API is stateless
+    if current_app.config.get('API_AUTH_MODE', 'session') == 'session':
+        login_user(user)
     
     return jsonify({
         'token': token,
+        'refresh_token': refresh_token,
+        'expires_in': int(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()),
         'user': user.to_dict()
     })
 
@@ -90,13 +84,29 @@ def register():
 @bp.route('/logout', methods=['POST'])
 @login_required
 def logout():
-    """Logout user"""
+    """Logout user and revoke the presented tokens"""
+    data = request.get_json(silent=True) or {}
+    claims = [decode_token(bearer_token() or ''),
+              decode_token(data.get('refresh_token') or '', 'refresh')]
+    for token_claims in claims:
+        if token_claims and token_claims['user_id'] == current_user.id:
+            revocations.revoke_token(token_claims)
+    db.session.commit()
     logout_user()
     return jsonify({'message': 'Successfully logged out'})
 
 @bp.route('/token/refresh', methods=['POST'])
-@login_required
+@csrf.exempt
 def refresh_token():
-    """Refresh JWT token"""
-    token = generate_token(current_user)
-    return jsonify({'token': token})
\ No newline at end of file
+    """Exchange a refresh token for a new access token"""
+    data = request.get_json(silent=True) or {}
+    claims = decode_token(data.get('refresh_token') or bearer_token() or '', 'refresh')
+    if claims is None:
+        return jsonify({'error': 'Invalid or expired refresh token'}), 401
+    
+    # Role and active status are still current: changing them revokes the refresh token
+    token = generate_token(TokenUser(claims))
+    return jsonify({
+        'token': token,
+        'expires_in': int(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
+    })
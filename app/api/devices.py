@@ -1,38 +1,100 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy import select, insert
 from app.models import Device
 from app import db
 from app.decorators import admin_required
+from app.utils.cache import device_cache
+from app.utils.export import stream_export, EXPORT_FORMATS
+from app.utils.pagination import keyset_paginate, get_page_args, InvalidCursor
+from app.utils.search import search_devices
+from app.utils.serializers import device_projection, field_args
+from app.utils.uploads import read_rows, InvalidUpload
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 
 bp = Blueprint('devices', __name__)
 
 @bp.route('/devices', methods=['GET'])
 @login_required
 def get_devices():
-    """Get list of all devices with optional filters"""
+    """Get a page of devices, newest arrivals first, with optional filters and fields= selection"""
     # Get query parameters
     status = request.args.get('status')
     brand = request.args.get('brand')
+    search = request.args.get('q', '').strip()
+    cursor, limit, include_total = get_page_args(
+        request,
+        current_app.config['API_PAGE_SIZE'],
+        current_app.config['API_MAX_PAGE_SIZE']
+    )
     
-    # Start with base query
-    query = Device.query
+    # Select plain rows rather than Device instances, only for the requested fields
+    try:
+        projection = device_projection.select(*field_args(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = projection.query()
     
     # Apply filters
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(Device.status == status)
     if brand:
-        query = query.filter_by(brand=brand)
+        query = query.filter(Device.brand == brand)
+    
+    # Full-text search: the best matches up to the page limit, not paginated
+    if search:
+        devices = search_devices(query, search).limit(limit).all()
+        return jsonify({
+            'items': projection.encode_all(devices),
+            'limit': limit,
+            'next_cursor': None,
+            'prev_cursor': None,
+            'total': None
+        })
+    
+    # Fetch a single keyset page
+    try:
+        page = keyset_paginate(query, Device.arrival_date, Device.id,
+                               cursor=cursor, limit=limit, include_total=include_total)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
-    # Execute query and return results
-    devices = query.all()
-    return jsonify([device.to_dict() for device in devices])
+    page['items'] = projection.encode_all(page['items'])
+    return jsonify(page)
+
+@bp.route('/devices/export', methods=['GET'])
+@login_required
+def export_devices():
+    """Stream every matching device as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unsupported export format'}), 400
+    
+    statement = db.select(
+        Device.id,
+        Device.imei,
+        Device.brand,
+        Device.model,
+        Device.purchase_price,
+        Device.status,
+        Device.arrival_date,
+        Device.modified_at,
+        Device.notes
+    )
+    if request.args.get('status'):
+        statement = statement.where(Device.status == request.args['status'])
+    if request.args.get('brand'):
+        statement = statement.where(Device.brand == request.args['brand'])
+    
+    return stream_export(statement.order_by(Device.id), export_format,
+                         f'devices-{datetime.utcnow():%Y%m%d}')
 
 @bp.route('/devices/<imei>', methods=['GET'])
 @login_required
 def get_device(imei):
     """Get device details by IMEI"""
-    device = Device.query.filter_by(imei=imei).first()
+    device = device_cache.get(imei)
     if not device:
         return jsonify({'error': 'Device not found'}), 404
     return jsonify(device.to_dict())
@@ -71,6 +133,114 @@ def create_device():
     
     return jsonify(device.to_dict()), 201
 
+def _validate_device_row(row):
+    """Validate a single intake row, returning (values, error)"""
+    if not isinstance(row, dict):
+        return None, 'Row must be an object'
+    
+    required_fields = ['imei', 'brand', 'model', 'purchase_price']
+    # A price of 0 is a value, not a missing field; negative values fail below
+    missing = [field for field in required_fields
+               if row.get(field) is None or not str(row.get(field)).strip()]
+    if missing:
+        return None, f'Missing required fields: {", ".join(missing)}'
+    
+    imei = str(row['imei']).strip()
+    if len(imei) != 15 or not imei.isdigit():
+        return None, 'IMEI must be exactly 15 digits'
+    
+    try:
+        purchase_price = Decimal(str(row['purchase_price']).strip())
+    except InvalidOperation:
+        return None, 'Invalid purchase price'
+    if not purchase_price.is_finite() or purchase_price < 0:
+        return None, 'Invalid purchase price'
+    
+    return {
+        'imei': imei,
+        'brand': str(row['brand']).strip(),
+        'model': str(row['model']).strip(),
+        'purchase_price': purchase_price,
+        'notes': row.get('notes') or ''
+    }, None
+
+@bp.route('/devices/bulk', methods=['POST'])
+@login_required
+@admin_required
+def bulk_create_devices():
+    """Add a shipment of devices from a JSON array or CSV upload.
+    
+    IMEIs are checked against the database with one IN query per chunk and
+    accepted rows are inserted in batches, all inside a single transaction.
+    Returns a per-row accept/reject report.
+    """
+    try:
+        rows = read_rows('devices')
+    except InvalidUpload as e:
+        return jsonify({'error': str(e)}), 400
+    if not rows:
+        return jsonify({'error': 'No devices provided'}), 400
+    
+    max_rows = current_app.config['BULK_INTAKE_MAX_ROWS']
+    if len(rows) > max_rows:
+        return jsonify({'error': f'Too many devices; at most {max_rows} per request'}), 400
+    
+    results = []
+    pending = []
+    seen_imeis = set()
+    
+    # Validate rows and drop duplicates within the upload itself
+    for index, row in enumerate(rows, start=1):
+        values, error = _validate_device_row(row)
+        if values and values['imei'] in seen_imeis:
+            values, error = None, 'Duplicate IMEI in upload'
+        if error:
+            imei = row.get('imei') if isinstance(row, dict) else None
+            results.append({'row': index, 'imei': imei, 'status': 'rejected', 'error': error})
+            continue
+        seen_imeis.add(values['imei'])
+        pending.append((index, values))
+    
+    chunk_size = current_app.config['BULK_INTAKE_CHUNK_SIZE']
+    try:
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            
+            # One set-based existence check per chunk
+            existing = set(db.session.scalars(
+                select(Device.imei).where(Device.imei.in_([values['imei'] for _, values in chunk]))
+            ))
+            
+            accepted = []
+            for index, values in chunk:
+                if values['imei'] in existing:
+                    results.append({
+                        'row': index,
+                        'imei': values['imei'],
+                        'status': 'rejected',
+                        'error': 'Device with this IMEI already exists'
+                    })
+                else:
+                    accepted.append(values)
+                    results.append({'row': index, 'imei': values['imei'], 'status': 'accepted'})
+            
+            if accepted:
+                db.session.execute(insert(Device), accepted)
+        
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Database error occurred'}), 500
+    
+    results.sort(key=lambda result: result['row'])
+    accepted_count = sum(1 for result in results if result['status'] == 'accepted')
+    
+    return jsonify({
+        'accepted': accepted_count,
+        'rejected': len(results) - accepted_count,
+        'results': results
+    }), 201 if accepted_count else 400
+
 @bp.route('/devices/<imei>', methods=['PUT'])
 @login_required
 @admin_required
@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required
 from sqlalchemy import func
-from app.models import Sale, Device, User
+from app.models import Device, User, DailySalesRollup
 from app import db
+from app.utils.rollups import rollup_totals, dashboard_totals
+from app.utils.buckets import sales_trend
+from app.utils.cache import report_cache
 from app.decorators import admin_required
 from datetime import datetime, timedelta
 
@@ -11,18 +14,14 @@ bp = Blueprint('reports', __name__)
 @bp.route('/reports/summary', methods=['GET'])
 @login_required
 @admin_required
+@report_cache.cached_response('api_reports.summary')
 def get_summary():
     """Get summary of sales and inventory"""
     # Get date range from query parameters
     days = int(request.args.get('days', 30))
-    date_from = datetime.utcnow() - timedelta(days=days)
     
-    # Total sales amount and profit
-    sales_data = db.session.query(
-        func.count(Sale.id).label('total_sales'),
-        func.sum(Sale.sale_price).label('total_revenue'),
-        func.sum(Sale.sale_price - Device.purchase_price).label('total_profit')
-    ).join(Device).filter(Sale.sale_date >= date_from).first()
+    # Sales and credit totals, shared with the web dashboard
+    totals = dashboard_totals(datetime.utcnow().date(), days=days)
     
     # Inventory status
     inventory_data = db.session.query(
@@ -31,17 +30,12 @@ def get_summary():
         func.count(Device.id).filter(Device.status == 'sold').label('sold_devices')
     ).first()
     
-    # Outstanding credit amount
-    credit_data = db.session.query(
-        func.sum(Sale.sale_price - Sale.amount_paid).label('total_credit')
-    ).filter(Sale.payment_type == 'credit').first()
-    
     return jsonify({
         'period_days': days,
         'sales_metrics': {
-            'total_sales': sales_data.total_sales or 0,
-            'total_revenue': float(sales_data.total_revenue or 0),
-            'total_profit': float(sales_data.total_profit or 0)
+            'total_sales': totals['total_sales'],
+            'total_revenue': totals['total_revenue'],
+            'total_profit': totals['total_profit']
         },
         'inventory_metrics': {
             'total_devices': inventory_data.total_devices,
@@ -49,41 +43,36 @@ def get_summary():
             'sold_devices': inventory_data.sold_devices
         },
         'credit_metrics': {
-            'total_outstanding': float(credit_data.total_credit or 0)
+            'total_outstanding': totals['outstanding_credit']
         }
     })
 
 @bp.route('/reports/staff/<int:user_id>', methods=['GET'])
 @login_required
 @admin_required
+@report_cache.cached_response('api_reports.staff')
 def get_staff_performance(user_id):
     """Get performance metrics for specific staff member"""
     user = User.query.get_or_404(user_id)
     
     # Get date range from query parameters
     days = int(request.args.get('days', 30))
-    date_from = datetime.utcnow() - timedelta(days=days)
+    date_from = datetime.utcnow().date() - timedelta(days=days)
     
     # Staff sales performance
-    sales_data = db.session.query(
-        func.count(Sale.id).label('total_sales'),
-        func.sum(Sale.sale_price).label('total_revenue'),
-        func.sum(Sale.sale_price - Device.purchase_price).label('total_profit'),
-        func.avg(Sale.sale_price - Device.purchase_price).label('avg_profit_per_sale')
-    ).join(Device).filter(
-        Sale.seller_id == user_id,
-        Sale.sale_date >= date_from
-    ).first()
+    sales_data = rollup_totals(date_from=date_from, seller_id=user_id)
+    total_profit = float(sales_data.total_profit or 0)
+    avg_profit_per_sale = total_profit / sales_data.total_sales if sales_data.total_sales else 0
     
     # Payment type breakdown
     payment_data = db.session.query(
-        Sale.payment_type,
-        func.count(Sale.id).label('count'),
-        func.sum(Sale.sale_price).label('total')
+        DailySalesRollup.payment_type,
+        func.sum(DailySalesRollup.sales_count).label('count'),
+        func.sum(DailySalesRollup.revenue).label('total')
     ).filter(
-        Sale.seller_id == user_id,
-        Sale.sale_date >= date_from
-    ).group_by(Sale.payment_type).all()
+        DailySalesRollup.seller_id == user_id,
+        DailySalesRollup.day >= date_from
+    ).group_by(DailySalesRollup.payment_type).all()
     
     return jsonify({
         'user': user.to_dict(),
@@ -91,8 +80,8 @@ def get_staff_performance(user_id):
         'performance_metrics': {
             'total_sales': sales_data.total_sales or 0,
             'total_revenue': float(sales_data.total_revenue or 0),
-            'total_profit': float(sales_data.total_profit or 0),
-            'avg_profit_per_sale': float(sales_data.avg_profit_per_sale or 0)
+            'total_profit': total_profit,
+            'avg_profit_per_sale': avg_profit_per_sale
         },
         'payment_breakdown': [{
             'type': data.payment_type,
@@ -104,6 +93,7 @@ def get_staff_performance(user_id):
 @bp.route('/reports/inventory', methods=['GET'])
 @login_required
 @admin_required
+@report_cache.cached_response('api_reports.inventory')
 def get_inventory_report():
     """Get detailed inventory report with brand/model breakdown"""
     # Inventory by brand and model
@@ -113,55 +103,67 @@ def get_inventory_report():
         func.count(Device.id).label('total'),
         func.count(Device.id).filter(Device.status == 'available').label('available'),
         func.count(Device.id).filter(Device.status == 'sold').label('sold'),
-        func.avg(Device.purchase_price).label('avg_purchase_price'),
-        func.avg(Sale.sale_price).label('avg_sale_price')
-    ).outerjoin(Sale).group_by(Device.brand, Device.model).all()
+        func.avg(Device.purchase_price).label('avg_purchase_price')
+    ).group_by(Device.brand, Device.model).all()
     
-    return jsonify([{
-        'brand': data.brand,
-        'model': data.model,
-        'total': data.total,
-        'available': data.available,
-        'sold': data.sold,
-        'avg_purchase_price': float(data.avg_purchase_price or 0),
-        'avg_sale_price': float(data.avg_sale_price or 0),
-        'avg_profit_margin': float((data.avg_sale_price or 0) - (data.avg_purchase_price or 0))
-    } for data in inventory_data])
+    # Average sale price per brand and model from the daily rollup
+    sale_data = db.session.query(
+        DailySalesRollup.brand,
+        DailySalesRollup.model,
+        func.sum(DailySalesRollup.sales_count).label('sales_count'),
+        func.sum(DailySalesRollup.revenue).label('revenue')
+    ).group_by(DailySalesRollup.brand, DailySalesRollup.model).all()
+    avg_sale_prices = {
+        (data.brand, data.model): float(data.revenue or 0) / data.sales_count
+        for data in sale_data if data.sales_count
+    }
+    
+    results = []
+    for data in inventory_data:
+        avg_purchase_price = float(data.avg_purchase_price or 0)
+        avg_sale_price = avg_sale_prices.get((data.brand, data.model), 0.0)
+        results.append({
+            'brand': data.brand,
+            'model': data.model,
+            'total': data.total,
+            'available': data.available,
+            'sold': data.sold,
+            'avg_purchase_price': avg_purchase_price,
+            'avg_sale_price': avg_sale_price,
+            'avg_profit_margin': avg_sale_price - avg_purchase_price
+        })
+    
+    return jsonify(results)
 
 @bp.route('/reports/trends', methods=['GET'])
 @login_required
 @admin_required
+@report_cache.cached_response('api_reports.trends')
 def get_sales_trends():
-    """Get daily/monthly sales trends"""
+    """Get sales trends by hour, day, ISO week, month or quarter, with empty periods filled in"""
     # Get date range from query parameters
-    days = int(request.args.get('days', 30))
-    group_by = request.args.get('group', 'day')  # 'day' or 'month'
-    date_from = datetime.utcnow() - timedelta(days=days)
+    days = request.args.get('days', 30, type=int)
+    group_by = request.args.get('group', 'day')  # hour, day, week, month or quarter
+    tz_name = request.args.get('tz', current_app.config['STORE_TIMEZONE'])
     
-    if group_by == 'month':
-        # Monthly sales trends
-        sales_trend = db.session.query(
-            func.date_trunc('month', Sale.sale_date).label('date'),
-            func.count(Sale.id).label('sales_count'),
-            func.sum(Sale.sale_price).label('revenue'),
-            func.sum(Sale.sale_price - Device.purchase_price).label('profit')
-        )
-    else:
-        # Daily sales trends
-        sales_trend = db.session.query(
-            func.date_trunc('day', Sale.sale_date).label('date'),
-            func.count(Sale.id).label('sales_count'),
-            func.sum(Sale.sale_price).label('revenue'),
-            func.sum(Sale.sale_price - Device.purchase_price).label('profit')
-        )
+    try:
+        date_from = datetime.utcnow().date() - timedelta(days=days)
+    except OverflowError:
+        return jsonify({'error': 'Invalid days'}), 400
     
-    sales_trend = sales_trend.join(Device).filter(
-        Sale.sale_date >= date_from
-    ).group_by('date').order_by('date').all()
+    try:
+        trend = sales_trend(group_by, tz_name=tz_name, date_from=date_from)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify([{
-        'date': data.date.isoformat(),
-        'sales_count': data.sales_count,
-        'revenue': float(data.revenue or 0),
-        'profit': float(data.profit or 0)
-    } for data in sales_trend])
\ No newline at end of file
+        'date': data.pop('bucket').isoformat(),
+        **data
+    } for data in trend])
+
+@bp.route('/reports/cache', methods=['GET'])
+@login_required
+@admin_required
+def get_cache_stats():
+    """Get report cache hit/miss counters for this worker"""
+    return jsonify(report_cache.stats())
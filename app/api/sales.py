@@ -1,20 +1,23 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from app.models import Sale, Device
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app.models import Sale, Device, User
 from app import db
 from app.decorators import admin_required
+from app.utils.cache import device_cache
+from app.utils.export import stream_export, EXPORT_FORMATS
+from app.utils.serializers import sale_projection, field_args
+from app.utils.pagination import keyset_paginate, get_page_args, InvalidCursor
 from datetime import datetime
 
 bp = Blueprint('sales', __name__)
 
-@bp.route('/sales', methods=['GET'])
-@login_required
-def get_sales():
-    """Get list of sales with optional filters"""
+def _sale_filters():
+    """Sale filters from the query string; raises ValueError on a malformed date"""
     # For staff, only show their own sales
     if not current_user.is_admin():
-        sales = Sale.query.filter_by(seller_id=current_user.id).all()
-        return jsonify([sale.to_dict() for sale in sales])
+        return [Sale.seller_id == current_user.id]
     
     # For admin, show all sales with optional filters
     payment_type = request.args.get('payment_type')
@@ -22,19 +25,116 @@ def get_sales():
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     
-    query = Sale.query
-    
+    filters = []
     if payment_type:
-        query = query.filter_by(payment_type=payment_type)
+        filters.append(Sale.payment_type == payment_type)
     if seller_id:
-        query = query.filter_by(seller_id=seller_id)
+        filters.append(Sale.seller_id == seller_id)
     if date_from:
-        query = query.filter(Sale.sale_date >= datetime.fromisoformat(date_from))
+        filters.append(Sale.sale_date >= datetime.fromisoformat(date_from))
     if date_to:
-        query = query.filter(Sale.sale_date <= datetime.fromisoformat(date_to))
+        filters.append(Sale.sale_date <= datetime.fromisoformat(date_to))
+    return filters
+
+@bp.route('/sales', methods=['GET'])
+@login_required
+def get_sales():
+    """Get a page of sales, newest first, with optional filters and fields=/expand= selection"""
+    cursor, limit, include_total = get_page_args(
+        request,
+        current_app.config['API_PAGE_SIZE'],
+        current_app.config['API_MAX_PAGE_SIZE']
+    )
+    
+    try:
+        projection = sale_projection.select(*field_args(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        query = projection.query().filter(*_sale_filters())
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+    
+    # Fetch a single keyset page
+    try:
+        page = keyset_paginate(query, Sale.sale_date, Sale.id,
+                               cursor=cursor, limit=limit, include_total=include_total)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
-    sales = query.all()
-    return jsonify([sale.to_dict() for sale in sales])
+    page['items'] = projection.encode_all(page['items'])
+    return jsonify(page)
+
+@bp.route('/sales/export', methods=['GET'])
+@login_required
+def export_sales():
+    """Stream every matching sale as CSV or NDJSON, oldest first"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unsupported export format'}), 400
+    try:
+        filters = _sale_filters()
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+    
+    # Flat columns rather than ORM objects: nothing accumulates in the session
+    statement = (
+        db.select(
+            Sale.id,
+            Sale.sale_date,
+            Device.imei,
+            Device.brand,
+            Device.model,
+            User.username.label('seller'),
+            Sale.sale_price,
+            Device.purchase_price,
+            (Sale.sale_price - Device.purchase_price).label('profit'),
+            Sale.payment_type,
+            Sale.amount_paid,
+            Sale.balance_due.label('balance_due'),
+            Sale.notes
+        )
+        .join(Device, Device.id == Sale.device_id)
+        .join(User, User.id == Sale.seller_id)
+        .where(*filters)
+        .order_by(Sale.sale_date, Sale.id)
+    )
+    return stream_export(statement, export_format, f'sales-{datetime.utcnow():%Y%m%d}')
+
+@bp.route('/sales/outstanding', methods=['GET'])
+@login_required
+def get_outstanding_sales():
+    """Get a page of sales that still have a balance due, plus the total owed"""
+    cursor, limit, include_total = get_page_args(
+        request,
+        current_app.config['API_PAGE_SIZE'],
+        current_app.config['API_MAX_PAGE_SIZE']
+    )
+    
+    try:
+        projection = sale_projection.select(*field_args(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # ~is_fully_paid compiles to amount_paid < sale_price, served by ix_sales_outstanding
+    filters = [~Sale.is_fully_paid]
+    if not current_user.is_admin():
+        filters.append(Sale.seller_id == current_user.id)
+    elif request.args.get('seller_id'):
+        filters.append(Sale.seller_id == request.args.get('seller_id', type=int))
+    
+    total_outstanding = db.session.query(func.sum(Sale.balance_due)).filter(*filters).scalar()
+    
+    try:
+        page = keyset_paginate(projection.query().filter(*filters), Sale.sale_date, Sale.id,
+                               cursor=cursor, limit=limit, include_total=include_total)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    page['items'] = projection.encode_all(page['items'])
+    page['total_outstanding'] = float(total_outstanding or 0)
+    return jsonify(page)
 
 @bp.route('/sales/<int:id>', methods=['GET'])
 @login_required
@@ -60,40 +160,168 @@ def create_sale():
         return jsonify({'error': 'Missing required fields'}), 400
     
     # Get device by IMEI
-    device = Device.query.filter_by(imei=data['device_imei']).first()
+    device = device_cache.get(data['device_imei'])
     if not device:
         return jsonify({'error': 'Device not found'}), 404
     
-    # Check if device is available
-    if not device.is_available:
-        return jsonify({'error': 'Device is not available for sale'}), 400
-    
     # Validate payment
     if float(data['amount_paid']) > float(data['sale_price']):
         return jsonify({'error': 'Amount paid cannot exceed sale price'}), 400
     
-    # Create sale
-    sale = Sale(
-        device_id=device.id,
-        seller_id=current_user.id,
-        sale_price=data['sale_price'],
-        payment_type=data['payment_type'],
-        amount_paid=data['amount_paid'],
-        notes=data.get('notes', '')
-    )
-    
-    # Mark device as sold
-    device.mark_as_sold()
-    
     try:
+        # Claim the device; fails if another checkout got there first
+        if not device.claim():
+            db.session.rollback()
+            return jsonify({'error': 'Device is not available for sale'}), 409
+        
+        sale = Sale(
+            device_id=device.id,
+            seller_id=current_user.id,
+            sale_price=data['sale_price'],
+            payment_type=data['payment_type'],
+            amount_paid=data['amount_paid'],
+            notes=data.get('notes', '')
+        )
         db.session.add(sale)
         db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Device is not available for sale'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Database error occurred'}), 500
     
     return jsonify(sale.to_dict()), 201
 
+def _validate_cart_item(item, default_payment_type):
+    """Validate a single cart line, returning (values, error)"""
+    if not isinstance(item, dict):
+        return None, 'Item must be an object'
+    if 'device_imei' not in item or 'sale_price' not in item:
+        return None, 'Missing required fields'
+    
+    payment_type = item.get('payment_type', default_payment_type)
+    if payment_type not in ('cash', 'credit'):
+        return None, 'Invalid payment type'
+    
+    # Cash sales default to paying in full
+    amount_paid = item.get('amount_paid', item['sale_price'] if payment_type == 'cash' else None)
+    if amount_paid is None:
+        return None, 'Missing amount paid'
+    
+    try:
+        if float(amount_paid) > float(item['sale_price']):
+            return None, 'Amount paid cannot exceed sale price'
+    except (TypeError, ValueError):
+        return None, 'Invalid amount'
+    
+    return {
+        'device_imei': str(item['device_imei']),
+        'sale_price': item['sale_price'],
+        'payment_type': payment_type,
+        'amount_paid': amount_paid,
+        'notes': item.get('notes', '')
+    }, None
+
+@bp.route('/checkout', methods=['POST'])
+@login_required
+def checkout():
+    """Sell several devices in one transaction.
+    
+    Body: {"items": [{"device_imei", "sale_price", "amount_paid"?,
+    "payment_type"?, "notes"?}, ...], "payment_type": "cash"|"credit",
+    "mode": "all_or_nothing"|"per_item"}. Devices are resolved with one
+    query, claimed with one conditional UPDATE and all sales are committed
+    together. In all_or_nothing mode (the default) any failing item aborts
+    the whole cart; in per_item mode the remaining items are still sold.
+    """
+    data = request.get_json() or {}
+    items = data.get('items')
+    mode = data.get('mode', 'all_or_nothing')
+    default_payment_type = data.get('payment_type', 'cash')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'No items provided'}), 400
+    if mode not in ('all_or_nothing', 'per_item'):
+        return jsonify({'error': 'Invalid mode'}), 400
+    max_items = current_app.config['CHECKOUT_MAX_ITEMS']
+    if len(items) > max_items:
+        return jsonify({'error': f'Too many items; at most {max_items} per checkout'}), 400
+    
+    # Validate every line before touching the database
+    results = []
+    lines = []
+    seen_imeis = set()
+    for index, item in enumerate(items):
+        values, error = _validate_cart_item(item, default_payment_type)
+        if values and values['device_imei'] in seen_imeis:
+            values, error = None, 'Duplicate IMEI in cart'
+        imei = values['device_imei'] if values else (item.get('device_imei') if isinstance(item, dict) else None)
+        results.append({'item': index, 'device_imei': imei, 'status': 'pending'})
+        if error:
+            results[index].update(status='rejected', error=error)
+            continue
+        seen_imeis.add(imei)
+        lines.append((index, values))
+    
+    # Resolve all devices with a single query
+    devices = {device.imei: device for device in
+               Device.query.filter(Device.imei.in_(seen_imeis)).all()} if seen_imeis else {}
+    for index, values in lines:
+        if values['device_imei'] not in devices:
+            results[index].update(status='rejected', error='Device not found')
+    lines = [(index, values) for index, values in lines if results[index]['status'] == 'pending']
+    
+    def reject_cart(status_code):
+        db.session.rollback()
+        for result in results:
+            if result['status'] != 'rejected':
+                result.pop('sale_id', None)
+                result.update(status='rejected', error='Cart was not processed')
+        return jsonify({'sold': 0, 'rejected': len(results), 'results': results}), status_code
+    
+    if mode == 'all_or_nothing' and len(lines) != len(items):
+        return reject_cart(400)
+    
+    try:
+        # Claim every device in one conditional UPDATE
+        claimed = Device.claim_many([devices[values['device_imei']].id for _, values in lines])
+        for index, values in lines:
+            if devices[values['device_imei']].id not in claimed:
+                results[index].update(status='rejected', error='Device is not available for sale')
+        if mode == 'all_or_nothing' and len(claimed) != len(lines):
+            return reject_cart(409)
+        
+        sales = []
+        for index, values in lines:
+            device = devices[values['device_imei']]
+            if device.id not in claimed:
+                continue
+            sale = Sale(
+                device_id=device.id,
+                seller_id=current_user.id,
+                sale_price=values['sale_price'],
+                payment_type=values['payment_type'],
+                amount_paid=values['amount_paid'],
+                notes=values['notes']
+            )
+            sales.append((index, sale))
+        
+        db.session.add_all(sale for _, sale in sales)
+        db.session.flush()
+        for index, sale in sales:
+            results[index].update(status='sold', sale_id=sale.id)
+        db.session.commit()
+    except IntegrityError:
+        return reject_cart(409)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Database error occurred'}), 500
+    
+    sold = len(sales)
+    status_code = 201 if sold else 409
+    return jsonify({'sold': sold, 'rejected': len(results) - sold, 'results': results}), status_code
+
 @bp.route('/sales/<int:id>/payment', methods=['POST'])
 @login_required
 def add_payment(id):
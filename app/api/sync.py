@@ -0,0 +1,34 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_login import login_required, current_user
+from app.utils.pagination import InvalidCursor
+from app.utils.sync import changes_since, WatermarkExpired
+
+bp = Blueprint('sync', __name__)
+
+@bp.route('/changes', methods=['GET'])
+@login_required
+def get_changes():
+    """Devices and sales changed, and devices deleted, since the given watermark.
+
+    Terminals call this with the watermark from their previous response
+    (none on first sync) and repeat while has_more is true. Staff only
+    receive their own sales, as in the sales list API.
+    """
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+    
+    try:
+        changes = changes_since(
+            request.args.get('since'),
+            limit=limit,
+            settle_seconds=current_app.config['SYNC_SETTLE_SECONDS'],
+            retention_days=current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'],
+            seller_id=None if current_user.is_admin() else current_user.id
+        )
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid watermark'}), 400
+    except WatermarkExpired:
+        # Deletions older than the watermark may have been pruned: start over
+        return jsonify({'error': 'Watermark expired, full resync required'}), 410
+    
+    return jsonify(changes)
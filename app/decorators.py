@@ -1,7 +1,7 @@
 from functools import wraps
 from flask import jsonify, current_app, request, g
 from flask_login import current_user
-import jwt
+from app.utils.tokens import TokenUser, bearer_token, decode_token
 
 def admin_required(f):
     """Decorator for views that require admin access"""
@@ -14,18 +14,8 @@ def admin_required(f):
 
 def verify_jwt_token(token):
     """Verify JWT token and return user_id"""
-    try:
-        payload = jwt.decode(
-            token,
-            current_app.config['JWT_SECRET_KEY'],
-            algorithms=['HS256']
-        )
-        return payload['user_id']
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
-        return None
+    claims = decode_token(token)
+    return claims['user_id'] if claims else None
 
 def token_required(f):
     """Decorator for views that require valid JWT token"""
@@ -39,23 +29,24 @@ def token_required(f):
                 'message': 'Please provide a valid JWT token'
             }), 401
             
-        parts = auth_header.split()
-        if len(parts) != 2 or parts[0].lower() != 'bearer':
+        token = bearer_token()
+        if token is None:
             return jsonify({
                 'error': 'Invalid authorization format',
                 'message': 'Token must be Bearer token'
             }), 401
             
-        token = parts[1]
-        user_id = verify_jwt_token(token)
-        
-        if user_id is None:
+        # Signature, expiry, active flag and revocation are all checked
+        # from the token itself, without a session or user query
+        claims = decode_token(token)
+        if claims is None:
             return jsonify({
                 'error': 'Invalid or expired token',
                 'message': 'Please provide a valid token or login again'
             }), 401
             
-        # Store user_id in g object for route access
-        g.user_id = user_id
+        # Store user in g object for route access
+        g.user_id = claims['user_id']
+        g.user = TokenUser(claims)
         return f(*args, **kwargs)
     return decorated_function
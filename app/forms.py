@@ -98,8 +98,8 @@ class SaleForm(FlaskForm):
     submit = SubmitField('Record Sale')
 
     def validate_imei(self, imei):
-        from app.models import Device
-        device = Device.query.filter_by(imei=imei.data).first()
+        from app.utils.cache import device_cache
+        device = device_cache.get(imei.data)
         if not device:
             raise ValidationError('Device with this IMEI not found in inventory.')
         if not device.is_available:
@@ -1,11 +1,19 @@
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.security import generate_password_hash, check_password_hash
-from app import db, login_manager, bcrypt
+from app import db, login_manager
+from app.utils.passwords import password_hasher
 
 class User(UserMixin, db.Model):
     """User model for authentication and role-based access control"""
     __tablename__ = 'users'
+    __table_args__ = (
+        # Keyset listing on the user admin screen
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False, index=True)
@@ -24,15 +32,47 @@ class User(UserMixin, db.Model):
 
     def set_password(self, password):
         """Hash and set user password using bcrypt"""
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        """Verify password against hash using bcrypt"""
-        return bcrypt.check_password_hash(self.password_hash, password)
+        """Verify password against hash using bcrypt, off the request thread"""
+        return password_hasher.check(self.password_hash, password)
+
+    def rehash_password(self, password):
+        """Re-hash a just-verified password if it was stored at another bcrypt cost"""
+        if not password_hasher.needs_rehash(self.password_hash):
+            return False
+        self.password_hash = password_hasher.hash(password)
+        # Same password, so existing tokens stay valid
+        self._password_rehashed = True
+        return True
 
     def is_admin(self):
         """Check if user has admin role"""
         return str(self.role).lower() == 'admin'
+
+    @property
+    def last_seen_at(self):
+        """Last-seen time, including an update this worker has not flushed yet"""
+        from app.utils.activity import last_seen_buffer
+        pending = last_seen_buffer.get(self.id)
+        if pending is not None and (self.last_seen is None or pending > self.last_seen):
+            return pending
+        return self.last_seen
+    
+    @classmethod
+    def search_clause(cls, term):
+        """Case-insensitive prefix match on username or email.
+
+        Written as ranges over lower(column) so both branches are served by
+        the expression indexes below instead of a full scan.
+        """
+        low = term.strip().lower()
+        high = low[:-1] + chr(ord(low[-1]) + 1)
+        return db.or_(
+            db.and_(db.func.lower(cls.username) >= low, db.func.lower(cls.username) < high),
+            db.and_(db.func.lower(cls.email) >= low, db.func.lower(cls.email) < high)
+        )
     
     def to_dict(self):
         """Convert user object to dictionary for API responses"""
@@ -43,22 +83,46 @@ class User(UserMixin, db.Model):
             'role': self.role,
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat(),
-            'last_seen': self.last_seen.isoformat()
+            'last_seen': self.last_seen_at.isoformat() if self.last_seen_at else None
         }
 
+# Case-insensitive prefix search on the user admin screen
+db.Index('ix_users_username_lower', db.func.lower(User.username))
+db.Index('ix_users_email_lower', db.func.lower(User.email))
+
+def _reverse_imei(context):
+    """Column default: the IMEI spelled backwards"""
+    imei = context.get_current_parameters().get('imei')
+    return imei[::-1] if imei else None
+
 class Device(db.Model):
     """Device model for mobile phone inventory management"""
     __tablename__ = 'devices'
+    __table_args__ = (
+        # Keyset listing, optionally filtered by status or brand
+        db.Index('ix_devices_arrival_date_id', 'arrival_date', 'id'),
+        db.Index('ix_devices_status_arrival_date', 'status', 'arrival_date', 'id'),
+        db.Index('ix_devices_brand_arrival_date', 'brand', 'arrival_date', 'id'),
+        # Covers the brand/model inventory breakdown and top products
+        db.Index('ix_devices_brand_model_covering', 'brand', 'model', 'status', 'purchase_price'),
+        # Partial-IMEI lookup of available devices at the counter
+        db.Index('ix_devices_status_imei_reversed', 'status', 'imei_reversed'),
+        # Delta sync: changes since a watermark
+        db.Index('ix_devices_modified_at_id', 'modified_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     imei = db.Column(db.String(15), unique=True, nullable=False, index=True)
-    brand = db.Column(db.String(50), nullable=False)
-    model = db.Column(db.String(100), nullable=False)
-    purchase_price = db.Column(db.Numeric(10, 2), nullable=False)
+    # active_history keeps the previous value so the daily rollup can move a sold device's totals
+    brand = db.column_property(db.Column(db.String(50), nullable=False), active_history=True)
+    model = db.column_property(db.Column(db.String(100), nullable=False), active_history=True)
+    purchase_price = db.column_property(db.Column(db.Numeric(10, 2), nullable=False), active_history=True)
     status = db.Column(db.String(20), default='available')  # available, sold
     arrival_date = db.Column(db.DateTime, default=datetime.utcnow)
     modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     notes = db.Column(db.Text)
+    # IMEI reversed, so "ends with" lookups become indexed prefix ranges
+    imei_reversed = db.Column(db.String(15), index=True, default=_reverse_imei)
     
     # Relationship
     sale = db.relationship('Sale', backref='device', uselist=False)
@@ -72,6 +136,64 @@ class Device(db.Model):
         """Mark device as sold"""
         self.status = 'sold'
         self.modified_at = datetime.utcnow()
+
+    def claim(self):
+        """Atomically mark the device as sold if it is still available.
+
+        Issues a single conditional UPDATE so that concurrent checkouts of
+        the same handset cannot both succeed. Returns True if this call
+        claimed the device; the row stays locked only until the caller's
+        transaction ends.
+
+        The instance may come from the device cache, which another worker's
+        edit does not clear, so the brand, model and purchase price the sale
+        and rollup use are reloaded from the claimed row: in the same
+        statement with UPDATE ... RETURNING where the database supports it.
+        """
+        stmt = (
+            db.update(Device)
+            .where(Device.id == self.id, Device.status == 'available')
+            .values(status='sold', modified_at=datetime.utcnow())
+            .execution_options(changed_imeis=(self.imei,))
+        )
+        current = (Device.brand, Device.model, Device.purchase_price)
+        if db.session.get_bind().dialect.update_returning:
+            row = db.session.execute(stmt.returning(*current)).first()
+        else:
+            if db.session.execute(stmt).rowcount != 1:
+                return False
+            row = db.session.execute(db.select(*current).where(Device.id == self.id)).first()
+        if row is None:
+            return False
+        for attr, value in zip(('brand', 'model', 'purchase_price'), row):
+            set_committed_value(self, attr, value)
+        return True
+
+    @classmethod
+    def imei_suffix_clause(cls, suffix):
+        """Match devices whose IMEI ends with suffix, as a range scan on imei_reversed"""
+        low = suffix[::-1]
+        high = low[:-1] + chr(ord(low[-1]) + 1)
+        return db.and_(cls.imei_reversed >= low, cls.imei_reversed < high)
+
+    @classmethod
+    def claim_many(cls, device_ids):
+        """Atomically mark every still-available device in device_ids as sold.
+
+        Returns the set of ids claimed by this call. Uses a single
+        UPDATE ... RETURNING where the database supports it.
+        """
+        if not device_ids:
+            return set()
+        stmt = (
+            db.update(cls)
+            .where(cls.id.in_(device_ids), cls.status == 'available')
+            .values(status='sold', modified_at=datetime.utcnow())
+        )
+        if db.session.get_bind().dialect.update_returning:
+            return set(db.session.scalars(stmt.returning(cls.id)))
+        return {device_id for device_id in device_ids
+                if db.session.get(cls, device_id).claim()}
     
     def to_dict(self):
         """Convert device object to dictionary for API responses"""
@@ -90,11 +212,27 @@ class Device(db.Model):
 class Sale(db.Model):
     """Sale model for tracking device sales"""
     __tablename__ = 'sales'
+    __table_args__ = (
+        # Keyset listing and date-range counts
+        db.Index('ix_sales_sale_date_id', 'sale_date', 'id'),
+        # Covers period revenue/profit/payment aggregations without table lookups
+        db.Index('ix_sales_sale_date_covering', 'sale_date', 'device_id', 'sale_price',
+                 'amount_paid', 'payment_type'),
+        db.Index('ix_sales_seller_id_sale_date', 'seller_id', 'sale_date'),
+        db.Index('ix_sales_payment_type_sale_date', 'payment_type', 'sale_date'),
+        # Delta sync: changes since a watermark
+        db.Index('ix_sales_modified_at_id', 'modified_at', 'id'),
+        # Partial covering index over sales that still have a balance; matches ~Sale.is_fully_paid
+        db.Index('ix_sales_outstanding', 'sale_date', 'seller_id', 'sale_price', 'amount_paid',
+                 sqlite_where=db.text('amount_paid < sale_price'),
+                 postgresql_where=db.text('amount_paid < sale_price')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    sale_price = db.Column(db.Numeric(10, 2), nullable=False)
+    # active_history keeps the previous value around so the daily rollup can apply deltas
+    sale_price = db.column_property(db.Column(db.Numeric(10, 2), nullable=False), active_history=True)
     payment_type = db.Column(db.String(20), nullable=False)  # cash, credit
-    amount_paid = db.Column(db.Numeric(10, 2), nullable=False)
+    amount_paid = db.column_property(db.Column(db.Numeric(10, 2), nullable=False), active_history=True)
     sale_date = db.Column(db.DateTime, default=datetime.utcnow)
     modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     notes = db.Column(db.Text)
@@ -103,20 +241,47 @@ class Sale(db.Model):
     device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), unique=True, nullable=False)
     seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
-    @property
+    @hybrid_property
     def profit(self):
         """Calculate profit from sale"""
         return float(self.sale_price) - float(self.device.purchase_price)
 
-    @property
+    @profit.expression
+    def profit(cls):
+        return cls.sale_price - (
+            db.select(Device.purchase_price)
+            .where(Device.id == cls.device_id)
+            .scalar_subquery()
+        )
+
+    @hybrid_property
     def balance_due(self):
         """Calculate remaining balance for credit sales"""
         return float(self.sale_price) - float(self.amount_paid)
 
-    @property
+    @balance_due.expression
+    def balance_due(cls):
+        return cls.sale_price - cls.amount_paid
+
+    @hybrid_property
     def is_fully_paid(self):
         """Check if sale is fully paid"""
         return self.balance_due <= 0
+
+    @is_fully_paid.expression
+    def is_fully_paid(cls):
+        # Negating this (~Sale.is_fully_paid) yields amount_paid < sale_price,
+        # the predicate of the ix_sales_outstanding partial index
+        return cls.amount_paid >= cls.sale_price
+
+    @classmethod
+    def query_with_relations(cls):
+        """Sale query that loads device and seller in the same SELECT.
+
+        Use this for listings that call to_dict() or render device/seller
+        fields, so N sales cost one query instead of 2N+1.
+        """
+        return cls.query.options(joinedload(cls.device), joinedload(cls.seller))
     
     def to_dict(self):
         """Convert sale object to dictionary for API responses"""
@@ -135,7 +300,71 @@ class Sale(db.Model):
             'notes': self.notes
         }
 
+class DailySalesRollup(db.Model):
+    """Per-day sales totals maintained alongside Sale writes for dashboards"""
+    __tablename__ = 'daily_sales_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'seller_id', 'brand', 'model', 'payment_type',
+                            name='uq_daily_sales_rollups_key'),
+        db.Index('ix_daily_sales_rollups_seller_id_day', 'seller_id', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    brand = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    payment_type = db.Column(db.String(20), nullable=False)
+    sales_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    cost = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    amount_paid = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    @property
+    def profit(self):
+        """Calculate profit for the rollup bucket"""
+        return float(self.revenue) - float(self.cost)
+
+class DeviceTombstone(db.Model):
+    """Record of a deleted device, so syncing terminals learn about the deletion"""
+    __tablename__ = 'device_tombstones'
+    __table_args__ = (
+        db.Index('ix_device_tombstones_deleted_at_id', 'deleted_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.Integer, nullable=False)
+    imei = db.Column(db.String(15), nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert tombstone to dictionary for sync responses"""
+        return {
+            'id': self.device_id,
+            'imei': self.imei,
+            'deleted_at': self.deleted_at.isoformat()
+        }
+
+class TokenRevocation(db.Model):
+    """Revoked API tokens, by token id (logout) or by user (deactivation, role or password change)"""
+    __tablename__ = 'token_revocations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(32), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    # Tokens of user_id issued at or before this instant are revoked
+    revoked_at = db.Column(db.Float, nullable=False)
+    # Once every affected token has expired the row can be pruned
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
 @login_manager.user_loader
 def load_user(user_id):
-    """Flask-Login user loader callback"""
-    return User.query.get(int(user_id))
+    """Flask-Login user loader callback, served from the user cache"""
+    from app.utils.cache import user_cache
+    return user_cache.get(int(user_id))
+
+@login_manager.request_loader
+def load_user_from_request(request):
+    """Flask-Login request loader: stateless API auth from a bearer token, no user query"""
+    from app.utils.tokens import user_from_request
+    return user_from_request(request)
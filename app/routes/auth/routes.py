@@ -1,10 +1,25 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+import re
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from app.models import User, db
 from app.forms import LoginForm, ProfileForm, RegisterForm
 from app.decorators import admin_required
+from app.utils.activity import last_seen_buffer
+from app.utils.cache import LocalCacheStore
+from app.utils.pagination import keyset_paginate, get_page_args, InvalidCursor
+from app.utils.passwords import password_hasher
+from app.utils.tokens import revocations
+from app.utils.uploads import read_rows, InvalidUpload
 from app.routes.auth import bp
 
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# Approximate user totals per filter set, independent of USER_CACHE_BACKEND
+user_counts = LocalCacheStore(max_entries=64)
+
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -18,9 +33,12 @@ def login():
         ).first()
         
         if user and user.check_password(form.password.data):
-            # Update last seen timestamp
-            user.last_seen = db.func.now()
-            db.session.commit()
+            # Bring the stored hash up to the configured bcrypt cost
+            if user.rehash_password(form.password.data):
+                db.session.commit()
+            
+            # Update last seen timestamp; written in the background
+            last_seen_buffer.touch(user.id)
             
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
@@ -41,22 +59,16 @@ def logout():
 @login_required
 @admin_required
 def users():
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-    search = request.args.get('search', '')
+    cursor, per_page, _ = get_page_args(request, 10, 100)
+    search = request.args.get('search', '').strip()
     role_filter = request.args.get('role', '')
     status_filter = request.args.get('status', '')
     
-    query = User.query
+    query = User.query.options(joinedload(User.created_by))
     
-    # Apply search filter
+    # Apply search filter: prefix match served by the lower() indexes
     if search:
-        query = query.filter(
-            db.or_(
-                User.username.ilike(f'%{search}%'),
-                User.email.ilike(f'%{search}%')
-            )
-        )
+        query = query.filter(User.search_clause(search))
     
     # Apply role filter
     if role_filter:
@@ -67,16 +79,27 @@ def users():
         is_active = status_filter == 'active'
         query = query.filter(User.is_active == is_active)
     
-    # Apply pagination
-    pagination = query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Apply keyset pagination, newest accounts first
+    try:
+        page = keyset_paginate(query, User.created_at, User.id, cursor=cursor, limit=per_page)
+    except InvalidCursor:
+        page = keyset_paginate(query, User.created_at, User.id, limit=per_page)
+    
+    # Approximate total: counted on the first page only and kept briefly per worker,
+    # so paging never repeats the COUNT
+    count_key = '&'.join(f'{name}={value}' for name, value in
+                         (('search', search.lower()), ('role', role_filter), ('status', status_filter)))
+    total = user_counts.get(count_key)
+    if total is None and not cursor:
+        total = query.order_by(None).count()
+        user_counts.set(count_key, total, current_app.config.get('USER_COUNT_CACHE_TTL', 30))
     
     form = RegisterForm()  # Form for the add user modal
     
     return render_template('auth/users.html',
-                         users=pagination.items,
-                         pagination=pagination,
+                         users=page['items'],
+                         page=page,
+                         total=total,
                          search=search,
                          role_filter=role_filter,
                          status_filter=status_filter,
@@ -136,6 +159,113 @@ def create_user():
     
     return redirect(url_for('auth.users'))
 
+def _validate_user_row(row):
+    """Validate a single import row, returning (values, error)"""
+    if not isinstance(row, dict):
+        return None, 'Row must be an object'
+    
+    required_fields = ['username', 'email', 'password']
+    missing = [field for field in required_fields if not str(row.get(field) or '').strip()]
+    if missing:
+        return None, f'Missing required fields: {", ".join(missing)}'
+    
+    username = str(row['username']).strip()
+    email = str(row['email']).strip()
+    role = str(row.get('role') or 'staff').strip().lower()
+    
+    if not 3 <= len(username) <= 64:
+        return None, 'Username must be between 3 and 64 characters'
+    if len(email) > 120 or not EMAIL_PATTERN.match(email):
+        return None, 'Invalid email address'
+    if role not in ('admin', 'staff'):
+        return None, 'Invalid role'
+    
+    return {
+        'username': username,
+        'email': email,
+        'password': str(row['password']),
+        'role': role
+    }, None
+
+@bp.route('/users/import', methods=['POST'])
+@login_required
+@admin_required
+def import_users():
+    """Create many users from a CSV upload or JSON array, reporting per row"""
+    try:
+        rows = read_rows('users')
+    except InvalidUpload as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not rows:
+        return jsonify({'success': False, 'error': 'No users provided'}), 400
+    
+    max_rows = current_app.config['USER_IMPORT_MAX_ROWS']
+    if len(rows) > max_rows:
+        return jsonify({'success': False, 'error': f'Too many users; at most {max_rows} per import'}), 400
+    
+    results = []
+    pending = []
+    seen_usernames = set()
+    seen_emails = set()
+    
+    # Validate rows and drop duplicates within the upload itself
+    for index, row in enumerate(rows, start=1):
+        values, error = _validate_user_row(row)
+        if values and values['username'] in seen_usernames:
+            values, error = None, 'Duplicate username in upload'
+        elif values and values['email'] in seen_emails:
+            values, error = None, 'Duplicate email in upload'
+        if error:
+            username = row.get('username') if isinstance(row, dict) else None
+            results.append({'row': index, 'username': username, 'status': 'rejected', 'error': error})
+            continue
+        seen_usernames.add(values['username'])
+        seen_emails.add(values['email'])
+        pending.append((index, values))
+    
+    # Two set-based uniqueness checks for the whole upload
+    taken_usernames = set(db.session.scalars(
+        select(User.username).where(User.username.in_([values['username'] for _, values in pending]))
+    ))
+    taken_emails = set(db.session.scalars(
+        select(User.email).where(User.email.in_([values['email'] for _, values in pending]))
+    ))
+    
+    accepted = []
+    for index, values in pending:
+        if values['username'] in taken_usernames:
+            error = 'Username already in use'
+        elif values['email'] in taken_emails:
+            error = 'Email already registered'
+        else:
+            accepted.append((index, values))
+            continue
+        results.append({'row': index, 'username': values['username'], 'status': 'rejected', 'error': error})
+    
+    try:
+        if accepted:
+            hashes = password_hasher.hash_many([values.pop('password') for _, values in accepted])
+            db.session.execute(insert(User), [
+                dict(values, password_hash=password_hash, creator_id=current_user.id)
+                for (_, values), password_hash in zip(accepted, hashes)
+            ])
+            db.session.commit()
+    except IntegrityError:
+        # A concurrent import or signup took one of the names
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Username or email was taken during the import; please retry'}), 409
+    
+    for index, values in accepted:
+        results.append({'row': index, 'username': values['username'], 'status': 'created'})
+    results.sort(key=lambda result: result['row'])
+    
+    return jsonify({
+        'success': bool(accepted),
+        'created': len(accepted),
+        'rejected': len(results) - len(accepted),
+        'results': results
+    }), 201 if accepted else 400
+
 @bp.route('/users/<int:user_id>/toggle_status', methods=['POST'])
 @login_required
 @admin_required
@@ -184,20 +314,26 @@ def bulk_update_status():
     activate = data['activate']
     
     try:
-        # Don't allow modifying current user's status
-        users = User.query.filter(
-            User.id.in_(user_ids),
-            User.id != current_user.id
-        ).all()
-        
-        for user in users:
-            user.is_active = activate
+        user_ids = {int(user_id) for user_id in user_ids}
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid request data'}), 400
+    
+    # Don't allow modifying current user's status
+    user_ids = [user_id for user_id in user_ids if user_id != current_user.id]
+    
+    try:
+        # One UPDATE for the whole selection
+        updated = User.query.filter(User.id.in_(user_ids)).update(
+            {User.is_active: bool(activate)}, synchronize_session=False
+        )
+        if not activate:
+            revocations.revoke_users(user_ids)
             
         db.session.commit()
         action = 'activated' if activate else 'deactivated'
         return jsonify({
             'success': True,
-            'message': f'{len(users)} users have been {action}'
+            'message': f'{updated} users have been {action}'
         })
         
     except Exception as e:
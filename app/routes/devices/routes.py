@@ -1,17 +1,37 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required
 from app.models import Device
 from app.decorators import admin_required
 from app.forms import DeviceForm
+from app.utils.search import search_devices
 from app.routes.devices import bp
 from app import db
 
 @bp.route('/inventory')
 @login_required
 def inventory():
-    devices = Device.query.all()
+    query = Device.query
+    
+    # Apply filters
+    if request.args.get('brand'):
+        query = query.filter_by(brand=request.args['brand'])
+    if request.args.get('status'):
+        query = query.filter_by(status=request.args['status'])
+    imei = request.args.get('imei', '').strip()
+    if len(imei) == 15:
+        query = query.filter_by(imei=imei)
+    elif imei.isdigit() and len(imei) >= current_app.config['IMEI_SUFFIX_MIN_DIGITS']:
+        query = query.filter(Device.imei_suffix_clause(imei))
+    
+    # Free-text search, best matches first
+    search = request.args.get('q', '').strip()
+    if search:
+        query = search_devices(query, search).limit(current_app.config['API_MAX_PAGE_SIZE'])
+    
+    devices = query.all()
+    brands = db.session.scalars(db.select(Device.brand).distinct().order_by(Device.brand)).all()
     device_form = DeviceForm()  # Form for the add device modal
-    return render_template('devices/inventory.html', devices=devices, device_form=device_form)
+    return render_template('devices/inventory.html', devices=devices, brands=brands, device_form=device_form)
 
 @bp.route('/device/add', methods=['GET', 'POST'])
 @login_required
@@ -1,149 +1,98 @@
-from flask import render_template, jsonify, request
+from flask import render_template, jsonify, request, current_app
 from flask_login import login_required
 from app.decorators import admin_required
-from app.models import Sale, Device
+from app.models import Sale, DailySalesRollup
 from app.routes.reports import bp
+from app.utils.rollups import dashboard_totals
+from app.utils.buckets import sales_trend
+from app.utils.cache import report_cache
 from app import db
 from sqlalchemy import func
 from datetime import datetime, timedelta
 
-@bp.route('/dashboard')
-@login_required
-def dashboard():
-    # Get time ranges for comparison
-    today = datetime.now()
+def _dashboard_data(today):
+    """Compute the cacheable dashboard aggregates for the 30 days up to today"""
     thirty_days_ago = today - timedelta(days=30)
-    previous_thirty_days = thirty_days_ago - timedelta(days=30)
-    
-    # Current period stats
-    current_sales = Sale.query.filter(Sale.sale_date >= thirty_days_ago).count()
-    current_revenue = db.session.query(
-        func.sum(Sale.sale_price)
-    ).filter(Sale.sale_date >= thirty_days_ago).scalar() or 0
-    
-    # Previous period stats for growth calculation
-    previous_sales = Sale.query.filter(
-        Sale.sale_date >= previous_thirty_days,
-        Sale.sale_date < thirty_days_ago
-    ).count()
-    previous_revenue = db.session.query(
-        func.sum(Sale.sale_price)
-    ).filter(
-        Sale.sale_date >= previous_thirty_days,
-        Sale.sale_date < thirty_days_ago
-    ).scalar() or 0
-    
-    # Calculate growth percentages
-    sales_growth = ((current_sales - previous_sales) / previous_sales * 100) if previous_sales > 0 else 0
-    revenue_growth = ((current_revenue - previous_revenue) / previous_revenue * 100) if previous_revenue > 0 else 0
     
-    # Get basic stats
-    stats = {
-        'total_sales': current_sales,
-        'total_revenue': current_revenue,
-        'sales_growth': round(sales_growth, 1),
-        'revenue_growth': round(revenue_growth, 1),
-        'available_devices': Device.query.filter_by(status='available').count(),
-        'outstanding_credit': db.session.query(
-            func.sum(Sale.sale_price - Sale.amount_paid)
-        ).filter(Sale.is_fully_paid == False).scalar() or 0
-    }
-    
-    # Get sales data for chart
-    sales_data = db.session.query(
-        func.date(Sale.sale_date).label('date'),
-        func.count(Sale.id).label('count'),
-        func.sum(Sale.sale_price).label('revenue')
-    ).filter(
-        Sale.sale_date >= thirty_days_ago
-    ).group_by(
-        func.date(Sale.sale_date)
-    ).order_by(func.date(Sale.sale_date)).all()
-    
-    # Fill in missing dates with zero values
-    date_dict = {(thirty_days_ago + timedelta(days=i)).date(): {'count': 0, 'revenue': 0.0} 
-                for i in range(31)}
-    
-    for row in sales_data:
-        date_dict[row.date] = {'count': row.count, 'revenue': float(row.revenue or 0)}
+    # Current and previous period stats, payment mix, credit and stock in one query
+    totals = dashboard_totals(today, days=30)
+    stats = {key: totals[key] for key in ('total_sales', 'total_revenue', 'sales_growth', 'revenue_growth',
+                                          'available_devices', 'outstanding_credit')}
     
+    # Daily sales for the chart, missing days filled with zeros
+    trend = sales_trend('day', date_from=thirty_days_ago, tz_name=current_app.config['STORE_TIMEZONE'])
     chart_data = {
-        'dates': [str(date) for date in sorted(date_dict.keys())],
-        'sales': [data['count'] for data in date_dict.values()],
-        'revenue': [data['revenue'] for data in date_dict.values()]
+        'dates': [str(data['bucket']) for data in trend],
+        'sales': [data['sales_count'] for data in trend],
+        'revenue': [data['revenue'] for data in trend]
     }
     
-    # Get payment type breakdown
     payment_data = {
-        'cash_sales': Sale.query.filter_by(payment_type='cash').count(),
-        'credit_sales': Sale.query.filter_by(payment_type='credit').count()
+        'cash_sales': totals['cash_sales'],
+        'credit_sales': totals['credit_sales']
     }
     
-    # Get recent sales
-    recent_sales = Sale.query.order_by(Sale.sale_date.desc()).limit(5).all()
-    
     # Get top products
     top_products = db.session.query(
-        Device.brand,
-        Device.model,
-        func.count(Sale.id).label('total_sold'),
-        func.sum(Sale.sale_price).label('revenue')
-    ).join(Sale).group_by(
-        Device.brand,
-        Device.model
+        DailySalesRollup.brand,
+        DailySalesRollup.model,
+        func.sum(DailySalesRollup.sales_count).label('total_sold'),
+        func.sum(DailySalesRollup.revenue).label('revenue')
+    ).group_by(
+        DailySalesRollup.brand,
+        DailySalesRollup.model
     ).order_by(
-        func.count(Sale.id).desc()
+        func.sum(DailySalesRollup.sales_count).desc()
     ).limit(5).all()
     
+    return {
+        'stats': stats,
+        'chart_data': chart_data,
+        'payment_data': payment_data,
+        'top_products': [{
+            'brand': row.brand,
+            'model': row.model,
+            'total_sold': row.total_sold,
+            'revenue': float(row.revenue or 0)
+        } for row in top_products]
+    }
+
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    today = datetime.utcnow().date()
+    data = report_cache.get_or_set('reports.dashboard', {'day': today.isoformat()},
+                                   lambda: _dashboard_data(today))
+    
+    # Recent sales are a cheap indexed lookup and carry ORM objects, so they are not cached
+    recent_sales = Sale.query_with_relations().order_by(Sale.sale_date.desc()).limit(5).all()
+    
     return render_template('reports/dashboard.html',
-                         stats=stats,
-                         chart_data=chart_data,
-                         payment_data=payment_data,
+                         stats=data['stats'],
+                         chart_data=data['chart_data'],
+                         payment_data=data['payment_data'],
                          recent_sales=recent_sales,
-                         top_products=top_products)
+                         top_products=data['top_products'])
 
 @bp.route('/reports/summary')
 @login_required
 @admin_required
+@report_cache.cached_response('reports.summary')
 def summary():
     days = request.args.get('days', 30, type=int)
-    cutoff_date = datetime.now() - timedelta(days=days)
-    
-    # Get sales metrics
-    total_sales = Sale.query.filter(Sale.sale_date >= cutoff_date).count()
-    total_revenue = db.session.query(
-        func.sum(Sale.sale_price)
-    ).filter(
-        Sale.sale_date >= cutoff_date
-    ).scalar() or 0
-    
-    # Calculate growth rates
-    prev_cutoff = cutoff_date - timedelta(days=days)
-    prev_sales = Sale.query.filter(
-        Sale.sale_date.between(prev_cutoff, cutoff_date)
-    ).count()
-    prev_revenue = db.session.query(
-        func.sum(Sale.sale_price)
-    ).filter(
-        Sale.sale_date.between(prev_cutoff, cutoff_date)
-    ).scalar() or 0
-    
-    sales_growth = ((total_sales - prev_sales) / prev_sales * 100) if prev_sales > 0 else 0
-    revenue_growth = ((total_revenue - prev_revenue) / prev_revenue * 100) if prev_revenue > 0 else 0
+    totals = dashboard_totals(datetime.utcnow().date(), days=days)
     
     return jsonify({
         'sales_metrics': {
-            'total_sales': total_sales,
-            'sales_growth': round(sales_growth, 1),
-            'total_revenue': round(total_revenue, 2),
-            'revenue_growth': round(revenue_growth, 1)
+            'total_sales': totals['total_sales'],
+            'sales_growth': totals['sales_growth'],
+            'total_revenue': round(totals['total_revenue'], 2),
+            'revenue_growth': totals['revenue_growth']
         },
         'inventory_metrics': {
-            'available_devices': Device.query.filter_by(status='available').count()
+            'available_devices': totals['available_devices']
         },
         'credit_metrics': {
-            'total_outstanding': db.session.query(
-                func.sum(Sale.sale_price - Sale.amount_paid)
-            ).scalar() or 0
+            'total_outstanding': totals['outstanding_credit']
         }
     })
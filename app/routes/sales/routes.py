@@ -1,9 +1,11 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from app.models import Device, Sale
 from app.forms import SaleForm
 from app.routes.sales import bp
 from app.utils.decorators import staff_required
+from app.utils.cache import device_cache
 from app import db
 from decimal import Decimal
 from datetime import datetime
@@ -13,9 +15,9 @@ from datetime import datetime
 def index():
     """Display sales dashboard"""
     if current_user.is_admin():
-        sales = Sale.query.order_by(Sale.sale_date.desc()).all()
+        sales = Sale.query_with_relations().order_by(Sale.sale_date.desc()).all()
     else:
-        sales = Sale.query.filter_by(seller_id=current_user.id).order_by(Sale.sale_date.desc()).all()
+        sales = Sale.query_with_relations().filter_by(seller_id=current_user.id).order_by(Sale.sale_date.desc()).all()
     return render_template('sales/index.html', sales=sales)
 
 @bp.route('/new', methods=['GET', 'POST'])
@@ -25,12 +27,19 @@ def new_sale():
     """Show new sale form and handle form submission"""
     form = SaleForm()
     if form.validate_on_submit():
-        device = Device.query.filter_by(imei=form.imei.data, status='available').first()
+        # Same instance SaleForm.validate_imei just looked up
+        device = device_cache.get_available(form.imei.data)
         if not device:
             flash('Device not found or not available', 'danger')
             return render_template('sales/new.html', form=form)
 
         try:
+            # Claim the device; fails if another checkout got there first
+            if not device.claim():
+                db.session.rollback()
+                flash('Device not found or not available', 'danger')
+                return render_template('sales/new.html', form=form), 409
+            
             # Create sale record
             sale = Sale(
                 device=device,
@@ -41,16 +50,17 @@ def new_sale():
                 notes=form.notes.data
             )
             
-            # Mark device as sold
-            device.mark_as_sold()
-            
             # Save changes
             db.session.add(sale)
             db.session.commit()
             
             flash('Sale recorded successfully!', 'success')
-            return redirect(url_for('sales.detail', sale_id=sale.id))
+            return redirect(url_for('sales.sale_detail', sale_id=sale.id))
             
+        except IntegrityError:
+            db.session.rollback()
+            flash('Device not found or not available', 'danger')
+            return render_template('sales/new.html', form=form), 409
         except Exception as e:
             db.session.rollback()
             flash(f'Error recording sale: {str(e)}', 'danger')
@@ -70,11 +80,16 @@ def create_sale():
         return jsonify({'error': 'Missing required fields'}), 400
     
     # Get device and validate availability
-    device = Device.query.filter_by(imei=data['imei'], status='available').first()
+    device = device_cache.get_available(data['imei'])
     if not device:
         return jsonify({'error': 'Device not found or not available'}), 404
     
     try:
+        # Claim the device; fails if another checkout got there first
+        if not device.claim():
+            db.session.rollback()
+            return jsonify({'error': 'Device not found or not available'}), 409
+        
         # Create sale record
         sale = Sale(
             device=device,
@@ -85,9 +100,6 @@ def create_sale():
             notes=data.get('notes', '')
         )
         
-        # Mark device as sold
-        device.mark_as_sold()
-        
         # Save changes
         db.session.add(sale)
         db.session.commit()
@@ -95,29 +107,64 @@ def create_sale():
         flash('Sale recorded successfully!', 'success')
         return jsonify(sale.to_dict()), 201
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Device not found or not available'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _device_summary(device):
+    return {
+        'imei': device.imei,
+        'brand': device.brand,
+        'model': device.model,
+        'purchase_price': device.purchase_price
+    }
+
 @bp.route('/sales/check_imei/<imei>')
 @login_required
 def check_imei(imei):
-    device = Device.query.filter_by(imei=imei, status='available').first()
-    if device:
-        return jsonify({
-            'found': True,
-            'brand': device.brand,
-            'model': device.model,
-            'purchase_price': device.purchase_price
-        })
-    return jsonify({'found': False})
+    """Look up an available device by full IMEI or by its last few digits"""
+    if not imei.isdigit() or len(imei) > 15:
+        return jsonify({'found': False, 'error': 'IMEI must be digits only'}), 400
+    
+    if len(imei) == 15:
+        device = device_cache.get_available(imei)
+        if device:
+            return jsonify(dict(_device_summary(device), found=True))
+        return jsonify({'found': False})
+    
+    # Partial IMEI from the box label: match on the trailing digits
+    min_digits = current_app.config['IMEI_SUFFIX_MIN_DIGITS']
+    if len(imei) < min_digits:
+        return jsonify({'found': False, 'error': f'Enter at least the last {min_digits} digits'}), 400
+    
+    max_matches = current_app.config['IMEI_SUFFIX_MAX_MATCHES']
+    devices = Device.query.filter(
+        Device.imei_suffix_clause(imei),
+        Device.status == 'available'
+    ).order_by(Device.imei).limit(max_matches + 1).all()
+    
+    if len(devices) == 1:
+        return jsonify(dict(_device_summary(devices[0]), found=True))
+    if not devices:
+        return jsonify({'found': False})
+    
+    # Several handsets end in these digits: let the clerk pick one
+    return jsonify({
+        'found': False,
+        'ambiguous': True,
+        'matches': [_device_summary(device) for device in devices[:max_matches]],
+        'truncated': len(devices) > max_matches
+    })
 
 @bp.route('/device/<imei>', methods=['GET'])
 @login_required
 @staff_required
 def get_device(imei):
     """Get device details by IMEI for sale"""
-    device = Device.query.filter_by(imei=imei, status='available').first()
+    device = device_cache.get_available(imei)
     if not device:
         return jsonify({'error': 'Device not found or not available'}), 404
     return jsonify(device.to_dict())
@@ -191,6 +191,40 @@ async function bulkUpdateStatus(activate) {
     }
 }
 
+// Bulk user import from a CSV file
+document.getElementById('importUsersForm').addEventListener('submit', async function(e) {
+    e.preventDefault();
+
+    const results = document.getElementById('importResults');
+    const formData = new FormData(this);
+
+    try {
+        const response = await fetch('/auth/users/import', {
+            method: 'POST',
+            headers: { 'X-CSRFToken': getCsrfToken() },
+            body: formData
+        });
+        const data = await response.json();
+
+        if (data.results) {
+            const rejected = data.results.filter(result => result.status === 'rejected')
+                .map(result => `Row ${result.row} (${result.username || '?'}): ${result.error}`);
+            results.innerHTML = `<p>${data.created} created, ${data.rejected} rejected</p>` +
+                rejected.map(line => `<div class="text-danger"></div>`).join('');
+            results.querySelectorAll('.text-danger').forEach((div, i) => { div.textContent = rejected[i]; });
+        } else {
+            results.textContent = data.error || 'Import failed';
+        }
+
+        if (data.created) {
+            document.getElementById('importUsersModal').addEventListener('hidden.bs.modal', () => location.reload(), { once: true });
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        results.textContent = 'Import failed';
+    }
+});
+
 // Password strength meter
 function checkPasswordStrength(password) {
     let strength = 0;
@@ -0,0 +1,111 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+from flask import g
+from sqlalchemy import bindparam, or_
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+
+
+class LastSeenBuffer:
+    """Write-behind buffer for User.last_seen.
+
+    Logins and authenticated requests record a timestamp in memory; a
+    background thread writes the pending values at most every flush
+    interval in one batched UPDATE, and again when the process exits.
+    Each gunicorn worker has its own buffer. The UPDATE only moves
+    last_seen forwards, so workers flushing in any order cannot overwrite
+    a newer value with an older one.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.flush_interval = 30
+        self.max_pending = 1000
+        self.flushes = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config.get('LAST_SEEN_FLUSH_INTERVAL', 30)
+        self.max_pending = app.config.get('LAST_SEEN_MAX_PENDING', 1000)
+        if app.config.get('LAST_SEEN_TRACK_REQUESTS', True):
+            app.after_request(self._track_request)
+
+    def _track_request(self, response):
+        # Only users Flask-Login already loaded for this request; never load one just to track it
+        user = g.get('_login_user')
+        if user is not None and user.is_authenticated:
+            self.touch(user.id)
+        return response
+
+    def touch(self, user_id, when=None):
+        """Record that a user was seen; written to the database on the next flush"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            current = self._pending.get(user_id)
+            if current is None or when > current:
+                self._pending[user_id] = when
+            pending = len(self._pending)
+        self._ensure_thread()
+        if pending >= self.max_pending:
+            self.flush()
+
+    def get(self, user_id):
+        """Timestamp for a user still waiting to be written by this worker, if any"""
+        return self._pending.get(user_id)
+
+    def flush(self):
+        """Write every pending timestamp in a single batched UPDATE"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self.app is None:
+            return 0
+
+        from app.models import User
+        table = User.__table__
+        stmt = table.update().where(
+            table.c.id == bindparam('user_id'),
+            or_(table.c.last_seen.is_(None), table.c.last_seen < bindparam('seen'))
+        ).values(last_seen=bindparam('seen'))
+        rows = [{'user_id': user_id, 'seen': seen} for user_id, seen in pending.items()]
+
+        try:
+            with self.app.app_context(), db.engine.begin() as connection:
+                connection.execute(stmt, rows)
+        except SQLAlchemyError:
+            # Database busy or unavailable: keep the values for the next flush
+            with self._lock:
+                for user_id, seen in pending.items():
+                    if user_id not in self._pending or self._pending[user_id] < seen:
+                        self._pending[user_id] = seen
+            self.app.logger.warning('Could not flush last_seen for %d users', len(pending))
+            return 0
+
+        self.flushes += 1
+        return len(rows)
+
+    def _ensure_thread(self):
+        """Start the flush thread in this process; gunicorn forks workers after import"""
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='last-seen-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+last_seen_buffer = LastSeenBuffer()
+atexit.register(last_seen_buffer.flush)
@@ -0,0 +1,240 @@
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from flask import current_app
+from sqlalchemy import case, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from app import db
+from app.models import Sale, Device, DailySalesRollup
+
+GRAINS = ('hour', 'day', 'week', 'month', 'quarter')
+
+
+class bucket_start(ColumnElement):
+    """Start of the hour/day/ISO week/month/quarter containing a timestamp or date.
+
+    Compiles to date_trunc() on Postgres and to the equivalent date
+    functions on SQLite, which has no date_trunc.
+    """
+    inherit_cache = True
+    _traverse_internals = [('grain', InternalTraversal.dp_string),
+                           ('expr', InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, grain, expr):
+        if grain not in GRAINS:
+            raise ValueError(f'Unknown grain {grain!r}')
+        self.grain = grain
+        self.expr = expr
+
+
+class shift_minutes(ColumnElement):
+    """A timestamp moved by a whole number of minutes, e.g. from UTC to store time"""
+    inherit_cache = True
+    _traverse_internals = [('minutes', InternalTraversal.dp_plain_obj),
+                           ('expr', InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, expr, minutes):
+        self.expr = expr
+        self.minutes = int(minutes)
+
+
+@compiles(bucket_start)
+def _bucket_start_default(element, compiler, **kw):
+    # Cast so a date column truncates as a plain timestamp, not in the session time zone
+    return f"date_trunc('{element.grain}', CAST({compiler.process(element.expr, **kw)} AS TIMESTAMP))"
+
+
+@compiles(bucket_start, 'sqlite')
+def _bucket_start_sqlite(element, compiler, **kw):
+    expr = compiler.process(element.expr, **kw)
+    if element.grain == 'hour':
+        return f"strftime('%Y-%m-%d %H:00:00', {expr})"
+    if element.grain == 'day':
+        return f'date({expr})'
+    if element.grain == 'week':
+        # Forward to Sunday (unchanged on a Sunday), then back to that week's Monday
+        return f"date({expr}, 'weekday 0', '-6 days')"
+    if element.grain == 'month':
+        return f"strftime('%Y-%m-01', {expr})"
+    return (f"strftime('%Y-', {expr}) || "
+            f"printf('%02d', (CAST(strftime('%m', {expr}) AS INTEGER) - 1) / 3 * 3 + 1) || '-01'")
+
+
+@compiles(shift_minutes)
+def _shift_minutes_default(element, compiler, **kw):
+    return f"({compiler.process(element.expr, **kw)} + INTERVAL '{element.minutes} minutes')"
+
+
+@compiles(shift_minutes, 'sqlite')
+def _shift_minutes_sqlite(element, compiler, **kw):
+    return f"datetime({compiler.process(element.expr, **kw)}, '{element.minutes:+d} minutes')"
+
+
+def get_timezone(name):
+    """ZoneInfo for a timezone name; raises ValueError for an unknown one"""
+    try:
+        return ZoneInfo(name or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f'Unknown timezone {name!r}') from e
+
+
+def _offset_minutes(tz, utc_moment):
+    return int(utc_moment.replace(tzinfo=timezone.utc).astimezone(tz).utcoffset().total_seconds() // 60)
+
+
+def offset_segments(tz, start, end):
+    """UTC offsets in effect between two naive UTC instants, as [(from_utc, minutes)].
+
+    Scans day by day and bisects to the minute at each offset change, so a
+    range spanning DST transitions costs a few hundred utcoffset() calls.
+    """
+    segments = [(start, _offset_minutes(tz, start))]
+    day = start
+    while day < end:
+        following = min(day + timedelta(days=1), end)
+        offset = _offset_minutes(tz, following)
+        if offset != segments[-1][1]:
+            low, high = day, following
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if _offset_minutes(tz, middle) == offset:
+                    high = middle
+                else:
+                    low = middle
+            segments.append((high.replace(second=0, microsecond=0), offset))
+        day = following
+    return segments
+
+
+def local_time(column, segments):
+    """SQL expression converting a naive UTC timestamp column to store wall-clock time"""
+    shifted = [(since, column if minutes == 0 else shift_minutes(column, minutes))
+               for since, minutes in segments]
+    if len(shifted) == 1:
+        return shifted[0][1]
+    # Later segments first: the first boundary the row is past picks its offset
+    return case(*[(column >= since, expr) for since, expr in reversed(shifted[1:])],
+                else_=shifted[0][1])
+
+
+def _add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def truncate(value, grain):
+    """Python counterpart of bucket_start for a local datetime"""
+    if grain == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.date() if isinstance(value, datetime) else value
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    if grain == 'month':
+        return day.replace(day=1)
+    if grain == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def step(value, grain):
+    """The bucket following a bucket start"""
+    if grain == 'hour':
+        return value + timedelta(hours=1)
+    if grain == 'day':
+        return value + timedelta(days=1)
+    if grain == 'week':
+        return value + timedelta(days=7)
+    return _add_months(value, 1 if grain == 'month' else 3)
+
+
+def bucket_sequence(grain, first, last):
+    """Every bucket start from the bucket containing first to the one containing last"""
+    current, last = truncate(first, grain), truncate(last, grain)
+    buckets = []
+    while current <= last:
+        buckets.append(current)
+        current = step(current, grain)
+    return buckets
+
+
+def bucket_count(grain, first, last):
+    """Number of buckets bucket_sequence would return, without building them"""
+    first, last = truncate(first, grain), truncate(last, grain)
+    if first > last:
+        return 0
+    if grain == 'hour':
+        return int((last - first).total_seconds() // 3600) + 1
+    if grain in ('day', 'week'):
+        return (last - first).days // (1 if grain == 'day' else 7) + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    return months // (1 if grain == 'month' else 3) + 1
+
+
+def _as_bucket(value, grain):
+    """Normalise a bucket_start result: SQLite returns text, Postgres a timestamp"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    return value if grain == 'hour' else value.date()
+
+
+def sales_trend(grain='day', date_from=None, tz_name=None, seller_id=None, now=None):
+    """Sales count, revenue and profit per bucket from the bucket holding date_from to now.
+
+    date_from is a store-local date, 30 days ago by default. UTC buckets
+    of a day or longer are summed from the daily rollup; hourly buckets
+    and other timezones need the individual sale times, so they read the
+    sales table with each sale_date shifted to store time. Every bucket in
+    the range is returned, empty ones as zeros. Raises ValueError when
+    that would be more than TREND_MAX_BUCKETS buckets.
+    """
+    tz = get_timezone(tz_name)
+    if grain not in GRAINS:
+        raise ValueError(f'Unknown grain {grain!r}')
+    now = now or datetime.utcnow()
+    local_now = now.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+    date_from = date_from or local_now.date() - timedelta(days=30)
+    # Widen the range to whole buckets, so the first week or month is not partial
+    start = truncate(datetime.combine(date_from, time.min), grain)
+    if not isinstance(start, datetime):
+        start = datetime.combine(start, time.min)
+    max_buckets = current_app.config.get('TREND_MAX_BUCKETS', 2000)
+    if bucket_count(grain, start, local_now) > max_buckets:
+        raise ValueError(f'Range too long for {grain} buckets; at most {max_buckets} buckets per request')
+
+    if grain != 'hour' and tz.key in ('UTC', 'Etc/UTC'):
+        bucket = bucket_start(grain, DailySalesRollup.day).label('bucket')
+        query = db.session.query(
+            bucket,
+            func.sum(DailySalesRollup.sales_count).label('sales_count'),
+            func.sum(DailySalesRollup.revenue).label('revenue'),
+            func.sum(DailySalesRollup.revenue - DailySalesRollup.cost).label('profit')
+        ).filter(DailySalesRollup.day >= start.date())
+        if seller_id is not None:
+            query = query.filter(DailySalesRollup.seller_id == seller_id)
+    else:
+        # Store-local midnight of date_from, in UTC
+        start_utc = start.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+        segments = offset_segments(tz, start_utc, now)
+        bucket = bucket_start(grain, local_time(Sale.sale_date, segments)).label('bucket')
+        query = db.session.query(
+            bucket,
+            func.count(Sale.id).label('sales_count'),
+            func.sum(Sale.sale_price).label('revenue'),
+            func.sum(Sale.sale_price - Device.purchase_price).label('profit')
+        ).join(Device, Device.id == Sale.device_id).filter(Sale.sale_date >= start_utc)
+        if seller_id is not None:
+            query = query.filter(Sale.seller_id == seller_id)
+
+    totals = {_as_bucket(row.bucket, grain): row for row in query.group_by(bucket).all()}
+
+    # One pass over the full bucket range fills the gaps
+    return [{
+        'bucket': bucket_value,
+        'sales_count': int(row.sales_count) if row else 0,
+        'revenue': float(row.revenue or 0) if row else 0.0,
+        'profit': float(row.profit or 0) if row else 0.0
+    } for bucket_value, row in ((bucket_value, totals.get(bucket_value))
+                                for bucket_value in bucket_sequence(grain, start, local_now))]
@@ -0,0 +1,468 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, has_request_context, request, make_response
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+
+# Writes to these tables change report and dashboard results
+TRACKED_TABLES = {'sales', 'devices', 'daily_sales_rollups'}
+
+
+class LocalCacheStore:
+    """Bounded per-process LRU store.
+
+    The data version lives in this process only, so with several gunicorn
+    workers a write seen by one worker reaches the others through the TTL.
+    Use the redis backend when results must be shared across workers.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_version(self):
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version += 1
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCacheStore:
+    """Store shared by every worker; eviction follows the server's maxmemory-policy (use allkeys-lru)"""
+
+    def __init__(self, url, prefix):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('The redis cache backend requires the redis package') from e
+        self.evictions = 0
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self._prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, pickle.dumps(value), ex=int(ttl))
+
+    def delete(self, key):
+        self._client.delete(self._prefix + key)
+
+    def get_version(self):
+        return int(self._client.get(self._prefix + 'version') or 0)
+
+    def bump_version(self):
+        self._client.incr(self._prefix + 'version')
+
+    def size(self):
+        return None
+
+
+class ReportCache:
+    """Caches report and dashboard results keyed by endpoint, parameters and data version.
+
+    The data version is bumped after any commit that wrote to the sales,
+    devices or rollup tables. With the redis backend the version is shared,
+    so no worker serves a result older than the last commit. With the local
+    backend each worker only sees its own commits: a write made through
+    another worker shows up once REPORT_CACHE_TTL expires.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('REPORT_CACHE_TTL', 300)
+        self.store = make_store(app.config.get('REPORT_CACHE_BACKEND', 'local'),
+                                app.config.get('CACHE_REDIS_URL'),
+                                app.config.get('REPORT_CACHE_MAX_ENTRIES', 256),
+                                'report-cache:')
+
+        for name, listener in (('do_orm_execute', self._track_execute),
+                               ('after_flush', self._track_flush),
+                               ('after_commit', self._after_commit),
+                               ('after_rollback', self._after_rollback)):
+            if not event.contains(db.session, name, listener):
+                event.listen(db.session, name, listener)
+
+        app.extensions['report_cache'] = self
+
+    # Write tracking
+
+    def _track_execute(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            if table is not None and table.name in TRACKED_TABLES:
+                orm_execute_state.session.info['report_data_changed'] = True
+
+    def _track_flush(self, session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if getattr(obj, '__tablename__', None) in TRACKED_TABLES:
+                session.info['report_data_changed'] = True
+                return
+
+    def _after_commit(self, session):
+        if session.info.pop('report_data_changed', False):
+            self.invalidate()
+
+    def _after_rollback(self, session):
+        session.info.pop('report_data_changed', None)
+
+    # Cache access
+
+    def invalidate(self):
+        """Bump the data version so every cached result becomes stale"""
+        if self.store is not None:
+            self.store.bump_version()
+
+    def make_key(self, namespace, params):
+        version = self.store.get_version()
+        items = sorted((str(key), str(value)) for key, value in params.items())
+        return f'{namespace}:{version}:' + '&'.join(f'{key}={value}' for key, value in items)
+
+    def get_or_set(self, namespace, params, compute):
+        """Return the cached value for namespace/params, computing and storing it on a miss"""
+        if self.store is None:
+            return compute()
+
+        key = self.make_key(namespace, params)
+        value = self.store.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = compute()
+        self.store.set(key, value, self.ttl)
+        return value
+
+    def cached_response(self, namespace):
+        """Decorator caching successful responses of a view, keyed by query string and URL arguments"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if self.store is None:
+                    return f(*args, **kwargs)
+
+                params = dict(kwargs)
+                for name, values in request.args.lists():
+                    params['arg:' + name] = ','.join(values)
+                key = self.make_key(namespace, params)
+
+                cached = self.store.get(key)
+                if cached is not None:
+                    self.hits += 1
+                    body, status, mimetype = cached
+                    return make_response(body, status, {'Content-Type': mimetype, 'X-Cache': 'HIT'})
+
+                self.misses += 1
+                response = make_response(f(*args, **kwargs))
+                if response.status_code == 200:
+                    self.store.set(key, (response.get_data(), response.status_code, response.mimetype), self.ttl)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return decorated_function
+        return decorator
+
+    def stats(self):
+        """Hit/miss counters for this worker process"""
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.store).__name__ if self.store else None,
+            'pid': os.getpid(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.store.evictions if self.store else 0,
+            'entries': self.store.size() if self.store else 0,
+            'data_version': self.store.get_version() if self.store else None
+        }
+
+
+def make_store(backend, redis_url, max_entries, prefix):
+    """Build a cache store for the configured backend, or None when disabled"""
+    if backend == 'redis':
+        return RedisCacheStore(redis_url, prefix=prefix)
+    if backend == 'local':
+        return LocalCacheStore(max_entries)
+    return None
+
+
+class UserCache:
+    """Bounded, TTL-based cache of user rows behind the Flask-Login user loader.
+
+    Column values are cached rather than ORM instances; a hit is attached
+    to the current session with merge(load=False), so no SELECT is issued.
+    Entries are dropped after any commit that writes the users table. The
+    local backend only drops them in the committing process, so it is
+    refused when WEB_CONCURRENCY says there are several workers: a
+    deactivated or demoted user must lose access everywhere at once.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        self.ttl = 60
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', 60)
+        backend = app.config.get('USER_CACHE_BACKEND', 'none')
+        if backend == 'local' and app.config.get('WEB_CONCURRENCY', 1) > 1:
+            raise RuntimeError('USER_CACHE_BACKEND=local cannot invalidate other workers; '
+                               'use redis or none with more than one worker')
+        self.store = make_store(backend,
+                                app.config.get('CACHE_REDIS_URL'),
+                                app.config.get('USER_CACHE_MAX_ENTRIES', 1024),
+                                'user-cache:')
+
+        for name, listener in (('do_orm_execute', self._track_execute),
+                               ('after_flush', self._track_flush),
+                               ('after_commit', self._after_commit),
+                               ('after_rollback', self._after_rollback)):
+            if not event.contains(db.session, name, listener):
+                event.listen(db.session, name, listener)
+
+        app.extensions['user_cache'] = self
+
+    # Write tracking
+
+    def _track_execute(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            if table is not None and table.name == 'users':
+                orm_execute_state.session.info['user_cache_clear'] = True
+
+    def _track_flush(self, session, flush_context):
+        from app.models import User
+        changed = session.info.setdefault('user_cache_changed', set())
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User) and obj.id is not None:
+                changed.add(obj.id)
+
+    def _after_commit(self, session):
+        if session.info.pop('user_cache_clear', False):
+            self.invalidate()
+        for user_id in session.info.pop('user_cache_changed', ()):
+            self.invalidate(user_id)
+
+    def _after_rollback(self, session):
+        session.info.pop('user_cache_clear', None)
+        session.info.pop('user_cache_changed', None)
+
+    # Cache access
+
+    def _key(self, user_id):
+        return f'user:{self.store.get_version()}:{user_id}'
+
+    def invalidate(self, user_id=None):
+        """Drop one cached user, or every cached user when no id is given"""
+        if self.store is None:
+            return
+        if user_id is None:
+            self.store.bump_version()
+        else:
+            self.store.delete(self._key(user_id))
+
+    def get(self, user_id):
+        """Return the user attached to the current session, loading it on a miss"""
+        from app.models import User
+        if self.store is None:
+            return db.session.get(User, user_id)
+
+        key = self._key(user_id)
+        values = self.store.get(key)
+        if values is not None:
+            self.hits += 1
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+        self.misses += 1
+        user = db.session.get(User, user_id)
+        if user is not None:
+            self.store.set(key, {column.key: getattr(user, column.key)
+                                 for column in User.__table__.columns}, self.ttl)
+        return user
+
+
+class DeviceCache:
+    """IMEI lookups for the scanner and sale-entry path.
+
+    Every lookup in a request is answered from a per-request identity map,
+    so the form validator and the view share one device instance. Available
+    devices are also kept across requests as column values in a small LRU
+    and attached with merge(load=False), like UserCache. An entry is dropped
+    after any commit that sells, edits or deletes its device.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        self.ttl = 30
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('DEVICE_CACHE_TTL', 30)
+        self.store = make_store(app.config.get('DEVICE_CACHE_BACKEND', 'local'),
+                                app.config.get('CACHE_REDIS_URL'),
+                                app.config.get('DEVICE_CACHE_MAX_ENTRIES', 512),
+                                'device-cache:')
+
+        for name, listener in (('do_orm_execute', self._track_execute),
+                               ('after_flush', self._track_flush),
+                               ('after_commit', self._after_commit),
+                               ('after_rollback', self._after_rollback)):
+            if not event.contains(db.session, name, listener):
+                event.listen(db.session, name, listener)
+
+        app.extensions['device_cache'] = self
+
+    # Write tracking
+
+    def _track_execute(self, orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            if table is not None and table.name == 'devices':
+                # Device.claim names the IMEIs it touches; any other bulk write clears everything
+                imeis = orm_execute_state.execution_options.get('changed_imeis')
+                if imeis is None:
+                    orm_execute_state.session.info['device_cache_clear'] = True
+                else:
+                    orm_execute_state.session.info.setdefault('device_cache_changed', set()).update(imeis)
+
+    def _track_flush(self, session, flush_context):
+        from app.models import Device
+        changed = session.info.setdefault('device_cache_changed', set())
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Device):
+                imeis = [imei for imei in inspect(obj).attrs.imei.history.sum() if imei]
+                if imeis:
+                    changed.update(imeis)
+                else:
+                    session.info['device_cache_clear'] = True
+
+    def _after_commit(self, session):
+        if session.info.pop('device_cache_clear', False):
+            self.invalidate()
+        for imei in session.info.pop('device_cache_changed', ()):
+            self.invalidate(imei)
+
+    def _after_rollback(self, session):
+        session.info.pop('device_cache_clear', None)
+        session.info.pop('device_cache_changed', None)
+
+    # Cache access
+
+    def _key(self, imei):
+        return f'device:{self.store.get_version()}:{imei}'
+
+    def _request_lookups(self):
+        if not has_request_context():
+            return {}
+        if '_device_lookups' not in g:
+            g._device_lookups = {}
+        return g._device_lookups
+
+    def invalidate(self, imei=None):
+        """Drop one cached device, or every cached device when no IMEI is given"""
+        lookups = self._request_lookups()
+        if imei is None:
+            lookups.clear()
+        else:
+            lookups.pop(imei, None)
+        if self.store is None:
+            return
+        if imei is None:
+            self.store.bump_version()
+        else:
+            self.store.delete(self._key(imei))
+
+    def get(self, imei):
+        """Return the device with this IMEI, whatever its status, or None"""
+        from app.models import Device
+        lookups = self._request_lookups()
+        if imei in lookups:
+            return lookups[imei]
+
+        values = self.store.get(self._key(imei)) if self.store is not None else None
+        if values is not None:
+            self.hits += 1
+            device = Device(**values)
+            make_transient_to_detached(device)
+            device = db.session.merge(device, load=False)
+        else:
+            self.misses += 1
+            device = Device.query.filter_by(imei=imei).first()
+            # Only devices still for sale are worth keeping between requests
+            if device is not None and device.is_available and self.store is not None:
+                self.store.set(self._key(imei), {column.key: getattr(device, column.key)
+                                                 for column in Device.__table__.columns}, self.ttl)
+        lookups[imei] = device
+        return device
+
+    def get_available(self, imei):
+        """Return the device with this IMEI if it is available for sale"""
+        device = self.get(imei)
+        return device if device is not None and device.is_available else None
+
+    def stats(self):
+        """Hit/miss counters for this worker process"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': self.store.size() if self.store else 0
+        }
+
+
+report_cache = ReportCache()
+user_cache = UserCache()
+device_cache = DeviceCache()
@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Response, current_app, request, stream_with_context
+from app import db
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+_json_encoder = json.JSONEncoder(separators=(',', ':'), default=_json_default)
+
+
+def _csv_chunks(result):
+    # csv writes numbers and dates with str(), which spreadsheets read as is
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(result.keys())
+    for rows in result.partitions():
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _ndjson_chunks(result):
+    columns = list(result.keys())
+    encode = _json_encoder.encode
+    for rows in result.partitions():
+        yield ''.join([encode(dict(zip(columns, row))) + '\n' for row in rows])
+
+
+def _gzip(chunks):
+    """Compress a stream of byte chunks into a single gzip member on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(statement, export_format, filename):
+    """Stream the rows of a Core select as a CSV or NDJSON download.
+
+    Rows are fetched from a server-side cursor ``EXPORT_CHUNK_SIZE`` at a
+    time and written out chunk by chunk, so worker memory stays flat no
+    matter how many rows are exported. The body is gzipped on the fly when
+    the client accepts it.
+    """
+    chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    render = _csv_chunks if export_format == 'csv' else _ndjson_chunks
+
+    def generate():
+        result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+        try:
+            for chunk in render(result):
+                yield chunk.encode('utf-8')
+        finally:
+            result.close()
+
+    body = generate()
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}.{export_format}"',
+        'Vary': 'Accept-Encoding',
+    }
+    if request.accept_encodings['gzip']:
+        body = _gzip(body)
+        headers['Content-Encoding'] = 'gzip'
+
+    return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[export_format], headers=headers)
@@ -0,0 +1,271 @@
+import atexit
+import fcntl
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from flask import Response, abort, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Request latency by endpoint.', LATENCY_BUCKETS),
+    'http_request_sql_queries': ('SQL statements executed per request.', QUERY_BUCKETS),
+    'http_request_sql_duration_seconds': ('Time spent in SQL per request.', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('Response body size by endpoint.', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests by endpoint, method and status.',
+    'report_cache_hits_total': 'Report cache hits.',
+    'report_cache_misses_total': 'Report cache misses.',
+}
+
+
+class MetricsRegistry:
+    """In-process metric store that can be merged across gunicorn workers.
+
+    Each worker periodically writes a JSON snapshot into METRICS_DIR; the
+    /metrics endpoint merges every snapshot with its own live values.
+    When a worker has exited, its snapshot is folded into a persistent
+    archived-metrics.json and removed, so merged counters never go down
+    when workers are recycled (the same approach as prometheus_client's
+    multiprocess mode).
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.flush_interval = 5
+        self._last_flush = 0.0
+        self._claimed_path = False
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name in HISTOGRAMS}
+        self._counters = {name: {} for name in COUNTERS}
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            series = self._histograms[name].setdefault(labels, [0] * len(buckets) + [0.0, 0])
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[name][labels] = self._counters[name].get(labels, 0) + amount
+
+    def snapshot(self):
+        """Return a JSON-serialisable copy of this worker's metrics"""
+        from app.utils.cache import report_cache
+        with self._lock:
+            data = {
+                'histograms': {name: [[list(labels), list(values)] for labels, values in series.items()]
+                               for name, series in self._histograms.items()},
+                'counters': {name: [[list(labels), value] for labels, value in series.items()]
+                             for name, series in self._counters.items()},
+            }
+        data['counters']['report_cache_hits_total'] = [[[], report_cache.hits]]
+        data['counters']['report_cache_misses_total'] = [[[], report_cache.misses]]
+        return data
+
+    def flush(self, force=False):
+        """Write this worker's snapshot to METRICS_DIR, at most once per flush interval"""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        if not self._claimed_path:
+            # A file under our pid was left by an earlier process that had the same pid
+            self._archive(path)
+            self._claimed_path = True
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def _archive(self, path):
+        """Fold an exited worker's snapshot into the archive and remove it"""
+        archive_path = os.path.join(self.directory, 'archived-metrics.json')
+        with open(os.path.join(self.directory, 'archived-metrics.lock'), 'w') as lock:
+            # Serialise with other workers archiving the same file
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            snapshot = _read_snapshot(path)
+            if snapshot is None:
+                return
+            archived = _read_snapshot(archive_path)
+            merged = _merge([archived, snapshot] if archived else [snapshot])
+            with open(archive_path + '.tmp', 'w') as f:
+                json.dump(_as_snapshot(*merged), f)
+            os.replace(archive_path + '.tmp', archive_path)
+            os.remove(path)
+
+    def collect(self):
+        """Merge the live snapshot with the ones written by other and exited workers"""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                if path == own:
+                    continue
+                if not _process_alive(path):
+                    self._archive(path)
+                    continue
+                snapshot = _read_snapshot(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+            archived = _read_snapshot(os.path.join(self.directory, 'archived-metrics.json'))
+            if archived is not None:
+                snapshots.append(archived)
+        return _merge(snapshots)
+
+    def render(self):
+        """Render merged metrics in the Prometheus text exposition format"""
+        histograms, counters = self.collect()
+        lines = []
+        for name, (description, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, values in sorted(histograms[name].items()):
+                base = _format_labels(('endpoint', 'method'), labels)
+                for bound, count in zip(buckets, values):
+                    lines.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{base},le="+Inf"}} {values[-1]}')
+                lines.append(f'{name}_sum{{{base}}} {values[-2]}')
+                lines.append(f'{name}_count{{{base}}} {values[-1]}')
+        for name, description in COUNTERS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in sorted(counters[name].items()):
+                label_text = _format_labels(('endpoint', 'method', 'status'), labels)
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(snapshots):
+    """Sum snapshots into (histograms, counters) keyed by label tuples"""
+    histograms = {name: {} for name in HISTOGRAMS}
+    counters = {name: {} for name in COUNTERS}
+    for snapshot in snapshots:
+        for name, series in snapshot['histograms'].items():
+            for labels, values in series:
+                merged = histograms[name].setdefault(tuple(labels), [0] * len(values))
+                for index, value in enumerate(values):
+                    merged[index] += value
+        for name, series in snapshot['counters'].items():
+            for labels, value in series:
+                counters[name][tuple(labels)] = counters[name].get(tuple(labels), 0) + value
+    return histograms, counters
+
+
+def _as_snapshot(histograms, counters):
+    """Inverse of _merge: the JSON snapshot layout workers write"""
+    return {
+        'histograms': {name: [[list(labels), values] for labels, values in series.items()]
+                       for name, series in histograms.items()},
+        'counters': {name: [[list(labels), value] for labels, value in series.items()]
+                     for name, series in counters.items()},
+    }
+
+
+def _process_alive(path):
+    """Whether the worker that wrote a metrics-<pid>.json snapshot is still running"""
+    try:
+        pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+        os.kill(pid, 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+def _format_labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush, force=True)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start_time'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('query_start_time', None)
+    if start is None or not has_app_context() or 'request_start_time' not in g:
+        return
+    g.sql_queries += 1
+    g.sql_time += time.perf_counter() - start
+
+
+def _start_request_timer():
+    g.request_start_time = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_time = 0.0
+
+
+def _record_request(response):
+    if 'request_start_time' not in g:
+        return response
+
+    elapsed = time.perf_counter() - g.request_start_time
+    endpoint = request.endpoint or 'unmatched'
+    labels = (endpoint, request.method)
+
+    registry.inc('http_requests_total', labels + (str(response.status_code),))
+    registry.observe('http_request_duration_seconds', labels, elapsed)
+    registry.observe('http_request_sql_queries', labels, g.sql_queries)
+    registry.observe('http_request_sql_duration_seconds', labels, g.sql_time)
+    if not response.is_streamed:
+        registry.observe('http_response_size_bytes', labels, response.calculate_content_length() or 0)
+
+    if current_app.config.get('SQL_METRICS_HEADER'):
+        response.headers['X-DB-Queries'] = str(g.sql_queries)
+        response.headers['X-DB-Time-Ms'] = f'{g.sql_time * 1000:.2f}'
+
+    registry.flush()
+    return response
+
+
+def metrics():
+    """Prometheus scrape endpoint; the scraper sends METRICS_TOKEN as a bearer token"""
+    expected = f'Bearer {current_app.config["METRICS_TOKEN"]}'
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+        abort(401)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    """Instrument every request, and expose /metrics when METRICS_TOKEN is set"""
+    registry.directory = app.config.get('METRICS_DIR')
+    registry.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+    if registry.directory:
+        os.makedirs(registry.directory, exist_ok=True)
+
+    app.before_request(_start_request_timer)
+    app.after_request(_record_request)
+    # Per-endpoint SQL timings are not for the public: no token, no endpoint
+    if app.config.get('METRICS_TOKEN'):
+        app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,89 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(direction, sort_value, row_id):
+    """Encode a keyset position as an opaque URL-safe token"""
+    payload = json.dumps({
+        'd': direction,
+        'k': [sort_value.isoformat() if sort_value else None, row_id]
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor into (direction, sort_value, row_id)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        direction = payload['d']
+        sort_value, row_id = payload['k']
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError, KeyError, json.JSONDecodeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def get_page_args(request, default_limit, max_limit):
+    """Read cursor, limit and include_total from the query string"""
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+    include_total = request.args.get('include_total', 'false').lower() in ('1', 'true', 'yes')
+    return request.args.get('cursor'), limit, include_total
+
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, limit=50, include_total=False):
+    """Paginate a query newest-first on (sort_column, id_column) using keyset cursors.
+
+    Each page is a single indexed range scan of ``limit + 1`` rows, so the
+    cost does not grow with how deep the client pages.
+    """
+    total = query.order_by(None).count() if include_total else None
+    key = tuple_(sort_column, id_column)
+
+    direction = 'next'
+    if cursor:
+        direction, sort_value, row_id = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(key < tuple_(sort_value, row_id))
+        else:
+            query = query.filter(key > tuple_(sort_value, row_id))
+
+    if direction == 'prev':
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    else:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+
+    sort_attr, id_attr = sort_column.key, id_column.key
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        if direction == 'next':
+            has_next, has_prev = has_more, cursor is not None
+        else:
+            has_next, has_prev = True, has_more
+        if has_next:
+            next_cursor = encode_cursor('next', getattr(last, sort_attr), getattr(last, id_attr))
+        if has_prev:
+            prev_cursor = encode_cursor('prev', getattr(first, sort_attr), getattr(first, id_attr))
+
+    return {
+        'items': rows,
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'total': total
+    }
@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from bcrypt import gensalt, hashpw
+from app import bcrypt
+
+
+def _hash_password(password, rounds):
+    """Hash one password in a pool process; same format as Flask-Bcrypt"""
+    return hashpw(password.encode('utf-8'), gensalt(rounds)).decode('utf-8')
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool.
+
+    bcrypt releases the GIL, so a handful of pool threads keep every core
+    busy during a login burst while the remaining gthread threads go on
+    serving ordinary requests instead of all hashing at once. Bulk imports
+    hash on a short-lived process pool instead.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.max_workers = 4
+        self.max_processes = 4
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.max_workers = app.config.get('PASSWORD_HASH_WORKERS', 4)
+        self.max_processes = app.config.get('PASSWORD_HASH_PROCESSES', 4)
+
+    def _pool(self):
+        # Created lazily so each forked gunicorn worker gets its own threads
+        if self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='bcrypt')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def hash(self, password):
+        """Hash a password at the configured cost"""
+        return self._pool().submit(bcrypt.generate_password_hash, password, self.rounds).result().decode('utf-8')
+
+    def hash_many(self, passwords):
+        """Hash a batch of passwords in parallel on a process pool, e.g. for bulk imports"""
+        processes = min(self.max_processes, len(passwords))
+        if processes < 2:
+            return [self.hash(password) for password in passwords]
+        # spawn: forking a threaded web worker could copy held locks into the children
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            return list(executor.map(_hash_password, passwords, repeat(self.rounds),
+                                     chunksize=max(1, len(passwords) // (processes * 4))))
+
+    def check(self, password_hash, password):
+        """Verify a password against a stored hash"""
+        if not password_hash:
+            return False
+        return self._pool().submit(bcrypt.check_password_hash, password_hash, password).result()
+
+    def needs_rehash(self, password_hash):
+        """Check whether a hash was made with a cost other than the configured one"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+
+password_hasher = PasswordHasher()
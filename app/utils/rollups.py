@@ -0,0 +1,274 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import click
+from sqlalchemy import event, func, inspect, insert, select, update, and_, true
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import Sale, Device, DailySalesRollup
+
+KEY_COLUMNS = ('day', 'seller_id', 'brand', 'model', 'payment_type')
+TOTAL_COLUMNS = ('sales_count', 'revenue', 'cost', 'amount_paid')
+# Device columns that are part of a sale's rollup key or totals
+DEVICE_COLUMNS = ('brand', 'model', 'purchase_price')
+
+
+def _as_decimal(value):
+    return Decimal(str(value or 0))
+
+
+def _history_delta(sale, attr):
+    """Return new minus old value for a changed Sale column"""
+    history = inspect(sale).attrs[attr].history
+    if not history.has_changes():
+        return Decimal(0)
+    old = history.deleted[0] if history.deleted else 0
+    new = history.added[0] if history.added else 0
+    return _as_decimal(new) - _as_decimal(old)
+
+
+def _sale_key(session, sale):
+    """Build the rollup key for a sale, or None if its device is unknown"""
+    device = session.get(Device, sale.device_id)
+    if device is None:
+        return None, None
+    sale_date = sale.sale_date or datetime.utcnow()
+    return (sale_date.date(), sale.seller_id, device.brand, device.model, sale.payment_type), device
+
+
+def _previous(obj, attr):
+    """Value of a column before this flush"""
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+
+def _device_moves(session, device, add):
+    """Move a sold device's sale to its new rollup key when brand, model or cost change"""
+    state = inspect(device)
+    if not any(state.attrs[attr].history.has_changes() for attr in DEVICE_COLUMNS):
+        return
+    rows = session.connection().execute(select(
+        Sale.id, Sale.sale_date, Sale.seller_id, Sale.payment_type, Sale.sale_price, Sale.amount_paid
+    ).where(Sale.device_id == device.id))
+    for row in rows:
+        sale = session.identity_map.get(session.identity_key(Sale, row.id))
+        if sale in session.new:
+            # Already counted under the device's new values
+            continue
+        # Take the sale's amounts from before the flush; its own deltas land on the new key
+        sale_price = _as_decimal(_previous(sale, 'sale_price') if sale is not None else row.sale_price)
+        amount_paid = _as_decimal(_previous(sale, 'amount_paid') if sale is not None else row.amount_paid)
+        day = row.sale_date.date()
+        add((day, row.seller_id, _previous(device, 'brand'), _previous(device, 'model'), row.payment_type),
+            sales_count=-1, revenue=-sale_price,
+            cost=-_as_decimal(_previous(device, 'purchase_price')), amount_paid=-amount_paid)
+        add((day, row.seller_id, device.brand, device.model, row.payment_type),
+            sales_count=1, revenue=sale_price,
+            cost=_as_decimal(device.purchase_price), amount_paid=amount_paid)
+
+
+def _collect_deltas(session):
+    """Work out rollup increments for the Sale and sold Device rows written in this flush"""
+    deltas = {}
+
+    def add(key, **values):
+        totals = deltas.setdefault(key, dict.fromkeys(TOTAL_COLUMNS, 0))
+        for column, value in values.items():
+            totals[column] += value
+
+    for obj in session.new:
+        if isinstance(obj, Sale):
+            key, device = _sale_key(session, obj)
+            if key:
+                add(key,
+                    sales_count=1,
+                    revenue=_as_decimal(obj.sale_price),
+                    cost=_as_decimal(device.purchase_price),
+                    amount_paid=_as_decimal(obj.amount_paid))
+
+    for obj in session.dirty:
+        if isinstance(obj, Sale) and session.is_modified(obj):
+            revenue = _history_delta(obj, 'sale_price')
+            amount_paid = _history_delta(obj, 'amount_paid')
+            if revenue or amount_paid:
+                key, _ = _sale_key(session, obj)
+                if key:
+                    add(key, revenue=revenue, amount_paid=amount_paid)
+
+    for obj in session.dirty:
+        if isinstance(obj, Device) and session.is_modified(obj):
+            _device_moves(session, obj, add)
+
+    return deltas
+
+
+def _upsert(connection, key, totals):
+    """Add totals to a rollup row, creating it if needed"""
+    table = DailySalesRollup.__table__
+    values = dict(zip(KEY_COLUMNS, key), **totals)
+
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert_fn = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert_fn(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={column: table.c[column] + stmt.excluded[column] for column in TOTAL_COLUMNS}
+        )
+        connection.execute(stmt)
+        return
+
+    # Generic fallback: update in place, insert when the bucket is new
+    condition = and_(*(table.c[column] == value for column, value in zip(KEY_COLUMNS, key)))
+    result = connection.execute(
+        update(table).where(condition).values(
+            {column: table.c[column] + totals[column] for column in TOTAL_COLUMNS}
+        )
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(**values))
+
+
+def update_rollups_after_flush(session, flush_context):
+    """Apply Sale inserts, payment changes and sold-device edits to the daily rollup in the same transaction"""
+    deltas = _collect_deltas(session)
+    if not deltas:
+        return
+    connection = session.connection()
+    table = DailySalesRollup.__table__
+    for key, totals in deltas.items():
+        _upsert(connection, key, totals)
+        if totals['sales_count'] < 0:
+            # A device edit moved the last sale out of this row
+            connection.execute(table.delete().where(
+                and_(*(table.c[column] == value for column, value in zip(KEY_COLUMNS, key))),
+                table.c.sales_count <= 0
+            ))
+
+
+def rebuild_daily_rollups(since=None):
+    """Recompute rollup rows from the sales table, optionally from a given day onwards"""
+    table = DailySalesRollup.__table__
+    day = func.date(Sale.sale_date)
+
+    delete = table.delete()
+    source = select(
+        day,
+        Sale.seller_id,
+        Device.brand,
+        Device.model,
+        Sale.payment_type,
+        func.count(Sale.id),
+        func.sum(Sale.sale_price),
+        func.sum(Device.purchase_price),
+        func.sum(Sale.amount_paid)
+    ).join(Device, Sale.device_id == Device.id)
+
+    if since:
+        delete = delete.where(table.c.day >= since)
+        source = source.where(Sale.sale_date >= datetime.combine(since, datetime.min.time()))
+
+    source = source.group_by(day, Sale.seller_id, Device.brand, Device.model, Sale.payment_type)
+
+    db.session.execute(delete)
+    db.session.execute(insert(table).from_select(list(KEY_COLUMNS + TOTAL_COLUMNS), source))
+    db.session.commit()
+
+
+def rollup_totals(date_from=None, date_to=None, seller_id=None):
+    """Sum the rollup over a day range: sales count, revenue, profit and amount collected"""
+    query = db.session.query(
+        func.coalesce(func.sum(DailySalesRollup.sales_count), 0).label('total_sales'),
+        func.sum(DailySalesRollup.revenue).label('total_revenue'),
+        func.sum(DailySalesRollup.revenue - DailySalesRollup.cost).label('total_profit'),
+        func.sum(DailySalesRollup.amount_paid).label('total_collected')
+    )
+    if date_from:
+        query = query.filter(DailySalesRollup.day >= date_from)
+    if date_to:
+        query = query.filter(DailySalesRollup.day < date_to)
+    if seller_id:
+        query = query.filter(DailySalesRollup.seller_id == seller_id)
+    return query.first()
+
+
+def outstanding_credit():
+    """Total unpaid balance on credit sales, read from the rollup"""
+    return db.session.query(
+        func.sum(DailySalesRollup.revenue - DailySalesRollup.amount_paid)
+    ).filter(DailySalesRollup.payment_type == 'credit').scalar() or 0
+
+
+def _growth(current, previous):
+    return round((current - previous) / previous * 100, 1) if previous > 0 else 0
+
+
+def dashboard_totals(today, days=30):
+    """Headline dashboard metrics in a single query.
+
+    Sales, revenue and profit for the last ``days`` days and the period
+    before it are conditional sums over the rollup rows of both periods,
+    read through the day index; the all-time payment mix and outstanding
+    credit are filtered sums over the whole rollup. The two single-row
+    aggregates and the available stock count are selected side by side,
+    so the database makes one round trip.
+    """
+    rollup = DailySalesRollup
+    current_start = today - timedelta(days=days)
+    previous_start = current_start - timedelta(days=days)
+    current = rollup.day >= current_start
+    previous = rollup.day < current_start
+    is_credit = rollup.payment_type == 'credit'
+
+    periods = select(
+        func.sum(rollup.sales_count).filter(current).label('current_sales'),
+        func.sum(rollup.revenue).filter(current).label('current_revenue'),
+        func.sum(rollup.revenue - rollup.cost).filter(current).label('current_profit'),
+        func.sum(rollup.sales_count).filter(previous).label('previous_sales'),
+        func.sum(rollup.revenue).filter(previous).label('previous_revenue')
+    ).where(rollup.day >= previous_start).subquery()
+    payments = select(
+        func.sum(rollup.sales_count).filter(rollup.payment_type == 'cash').label('cash_sales'),
+        func.sum(rollup.sales_count).filter(is_credit).label('credit_sales'),
+        func.sum(rollup.revenue - rollup.amount_paid).filter(is_credit).label('outstanding_credit')
+    ).subquery()
+    available = select(func.count(Device.id)).where(Device.status == 'available').scalar_subquery()
+
+    # Both aggregates are single rows, so the unconditional join just puts them side by side
+    row = db.session.execute(select(periods, payments, available.label('available_devices'))
+                             .select_from(periods.join(payments, true()))).one()
+
+    current_sales = row.current_sales or 0
+    current_revenue = float(row.current_revenue or 0)
+    previous_revenue = float(row.previous_revenue or 0)
+    return {
+        'total_sales': current_sales,
+        'total_revenue': current_revenue,
+        'total_profit': float(row.current_profit or 0),
+        'sales_growth': _growth(current_sales, row.previous_sales or 0),
+        'revenue_growth': _growth(current_revenue, previous_revenue),
+        'cash_sales': row.cash_sales or 0,
+        'credit_sales': row.credit_sales or 0,
+        'outstanding_credit': float(row.outstanding_credit or 0),
+        'available_devices': row.available_devices
+    }
+
+
+@click.group('rollups')
+def rollups_cli():
+    """Maintain the daily sales rollup table."""
+
+
+@rollups_cli.command('rebuild')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Only rebuild days on or after this date (YYYY-MM-DD).')
+def rebuild_command(since):
+    """Backfill or rebuild the daily sales rollup from the sales table."""
+    rebuild_daily_rollups(since.date() if since else None)
+    click.echo('Daily sales rollup rebuilt.')
+
+
+def init_rollups(app):
+    """Register the rollup flush hook and CLI commands"""
+    if not event.contains(db.session, 'after_flush', update_rollups_after_flush):
+        event.listen(db.session, 'after_flush', update_rollups_after_flush)
+    app.cli.add_command(rollups_cli)
@@ -0,0 +1,134 @@
+import re
+import click
+from flask import current_app
+from sqlalchemy import DDL, column, event, func, literal_column, or_, select, table, text
+from app import db
+from app.models import Device
+
+# External-content FTS5 index over devices; the triggers keep it in step with
+# every write to devices, including bulk Core inserts and raw SQL
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS devices_fts USING fts5("
+    "brand, model, notes, content='devices', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS devices_fts_insert AFTER INSERT ON devices BEGIN "
+    "INSERT INTO devices_fts(rowid, brand, model, notes) "
+    "VALUES (new.id, new.brand, new.model, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS devices_fts_delete AFTER DELETE ON devices BEGIN "
+    "INSERT INTO devices_fts(devices_fts, rowid, brand, model, notes) "
+    "VALUES ('delete', old.id, old.brand, old.model, old.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS devices_fts_update AFTER UPDATE OF brand, model, notes ON devices BEGIN "
+    "INSERT INTO devices_fts(devices_fts, rowid, brand, model, notes) "
+    "VALUES ('delete', old.id, old.brand, old.model, old.notes); "
+    "INSERT INTO devices_fts(rowid, brand, model, notes) "
+    "VALUES (new.id, new.brand, new.model, new.notes); END",
+]
+
+devices_fts = table('devices_fts', column('rowid'), column('brand'), column('model'), column('notes'))
+
+# bm25 column weights: a brand or model hit outranks a mention in the notes
+RANK_WEIGHTS = (5.0, 10.0, 1.0)
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# FTS5 support per database URL, probed once
+_fts_support = {}
+
+
+def fts_available(connection):
+    """Check whether the database can hold the FTS5 index"""
+    url = str(connection.engine.url)
+    if url not in _fts_support:
+        if connection.dialect.name != 'sqlite':
+            _fts_support[url] = False
+        else:
+            options = {row[0] for row in connection.execute(text('PRAGMA compile_options'))}
+            _fts_support[url] = 'ENABLE_FTS5' in options
+    return _fts_support[url]
+
+
+def _create_fts(target, connection, **kw):
+    if fts_available(connection):
+        for statement in FTS_DDL:
+            connection.execute(DDL(statement))
+
+
+def _drop_fts(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(DDL('DROP TABLE IF EXISTS devices_fts'))
+
+
+def search_terms(query_text):
+    """Split free text into search tokens"""
+    return TOKEN_PATTERN.findall(query_text or '')[:10]
+
+
+def match_expression(terms):
+    """Build an FTS5 MATCH string: every term must match, as a word prefix"""
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_devices(query, query_text):
+    """Restrict a Device query to full-text matches, best matches first.
+
+    bm25 ranking costs time in proportion to the number of matches, so a
+    broad query matching more than SEARCH_RANK_LIMIT devices is returned
+    newest first instead, which FTS5 streams straight from its index.
+    Databases without FTS5 fall back to per-term LIKE matching.
+    """
+    terms = search_terms(query_text)
+    if not terms:
+        return query
+
+    if not fts_available(db.session.connection()):
+        for term in terms:
+            pattern = f'%{term}%'
+            query = query.filter(or_(Device.brand.ilike(pattern),
+                                     Device.model.ilike(pattern),
+                                     Device.notes.ilike(pattern)))
+        return query.order_by(Device.arrival_date.desc(), Device.id.desc())
+
+    match = literal_column('devices_fts').op('MATCH')(match_expression(terms))
+    rank_limit = current_app.config.get('SEARCH_RANK_LIMIT', 2000)
+    probe = select(devices_fts.c.rowid).where(match).limit(rank_limit + 1).subquery()
+    if db.session.scalar(select(func.count()).select_from(probe)) > rank_limit:
+        return query.join(devices_fts, devices_fts.c.rowid == Device.id).filter(match).order_by(
+            devices_fts.c.rowid.desc()
+        )
+
+    rank = func.bm25(literal_column('devices_fts'), *RANK_WEIGHTS).label('rank')
+    matches = select(devices_fts.c.rowid, rank).where(match).subquery()
+    return query.join(matches, matches.c.rowid == Device.id).order_by(matches.c.rank, Device.id)
+
+
+def rebuild_search_index():
+    """Repopulate the FTS5 index from the devices table"""
+    connection = db.session.connection()
+    if not fts_available(connection):
+        return False
+    _create_fts(None, connection)
+    connection.execute(text("INSERT INTO devices_fts(devices_fts) VALUES('rebuild')"))
+    db.session.commit()
+    return True
+
+
+@click.group('search')
+def search_cli():
+    """Maintain the device full-text search index."""
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the device full-text search index."""
+    if rebuild_search_index():
+        click.echo('Device search index rebuilt.')
+    else:
+        click.echo('Full-text search is not available on this database.')
+
+
+def init_search(app):
+    """Create the FTS5 index alongside the devices table and register CLI commands"""
+    for name, listener in (('after_create', _create_fts), ('before_drop', _drop_fts)):
+        if not event.contains(Device.__table__, name, listener):
+            event.listen(Device.__table__, name, listener)
+    app.cli.add_command(search_cli)
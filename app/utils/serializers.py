@@ -0,0 +1,207 @@
+from sqlalchemy import Date, DateTime, Numeric
+from app import db
+from app.models import Device, Sale, User
+
+# Distinct fields=/expand= combinations kept per projection
+MAX_CACHED_SUBSETS = 64
+
+
+class computed:
+    """A projection field derived in Python from one or more selected columns"""
+
+    def __init__(self, function, *columns):
+        self.function = function
+        self.columns = columns
+
+
+class Projection:
+    """Serializes list endpoints from selected columns instead of ORM instances.
+
+    ``fields`` maps output keys to mapped columns, ``computed`` fields or
+    nested field mappings for related models, mirroring a model's
+    to_dict(). The columns are selected as plain rows, skipping object
+    construction and the identity map, and each row is turned into a dict
+    by an encoder generated once per projection: a single function that
+    unpacks the row and builds the dict literal with the per-type
+    conversions inlined. ``always`` columns are selected even when not
+    output, e.g. the keyset pagination columns.
+    """
+
+    def __init__(self, root, fields, joins=(), always=()):
+        self.root = root
+        self.fields = fields
+        self.joins = joins
+        self.always = always
+        self.columns = []
+        self._indexes = {}
+        self._functions = {}
+        self._models = set()
+        self._subsets = {}
+        for column in always:
+            self._column(column, column.key)
+        source = self._literal(fields, '')
+        names = ', '.join(f'c{index}' for index in range(len(self.columns)))
+        code = f'def encode(row):\n    {names}, = row\n    return {source}\n'
+        namespace = dict(self._functions)
+        exec(compile(code, f'<projection {root.__name__}>', 'exec'), namespace)
+        self.encode = namespace['encode']
+        self.source = code
+
+    def _column(self, column, label):
+        """Select a column once, however many fields use it; returns its variable name"""
+        if id(column) not in self._indexes:
+            self._indexes[id(column)] = len(self.columns)
+            self.columns.append(column.label(label or f'_arg{len(self.columns)}'))
+            self._models.add(column.class_)
+        return f'c{self._indexes[id(column)]}'
+
+    def _literal(self, fields, prefix):
+        items = []
+        for key, field in fields.items():
+            label = prefix + key
+            if isinstance(field, dict):
+                source = self._literal(field, label + '__')
+            elif isinstance(field, computed):
+                name = f'_f{len(self._functions)}'
+                self._functions[name] = field.function
+                args = ', '.join(self._column(column, None) for column in field.columns)
+                source = f'{name}({args})'
+            else:
+                value = self._column(field, label)
+                if isinstance(field.type, (DateTime, Date)):
+                    source = f'({value}.isoformat() if {value} is not None else None)'
+                elif isinstance(field.type, Numeric):
+                    source = f'(str({value}) if {value} is not None else None)'
+                else:
+                    source = value
+            items.append(f'{key!r}: {source}')
+        return '{' + ', '.join(items) + '}'
+
+    def query(self):
+        """A query selecting this projection's columns, ready for filters and keyset_paginate"""
+        query = db.session.query(*self.columns).select_from(self.root)
+        # Join only the related tables some selected column comes from
+        for target, onclause in self.joins:
+            if target in self._models:
+                query = query.join(target, onclause)
+        return query
+
+    def encode_all(self, rows):
+        encode = self.encode
+        return [encode(row) for row in rows]
+
+    def select(self, fields=None, expand=None):
+        """Projection restricted to the requested fields and embedded objects.
+
+        ``fields`` lists top-level keys, or ``relation.key`` for a key of an
+        embedded object; ``expand`` lists embedded objects to include in
+        full. With neither, the full to_dict() shape is kept. Raises
+        ValueError for an unknown name.
+        """
+        if not fields and not expand:
+            return self
+        cache_key = (tuple(fields or ()), tuple(expand or ()))
+        subset = self._subsets.get(cache_key)
+        if subset is None:
+            subset = Projection(self.root, self._select_fields(fields, expand),
+                                joins=self.joins, always=self.always)
+            # Field lists come from the query string, so keep the cache bounded
+            if len(self._subsets) >= MAX_CACHED_SUBSETS:
+                self._subsets.clear()
+            self._subsets[cache_key] = subset
+        return subset
+
+    def _select_fields(self, fields, expand):
+        relations = {key for key, field in self.fields.items() if isinstance(field, dict)}
+        for name in expand or ():
+            if name not in relations:
+                raise ValueError(f'Cannot expand {name!r}')
+
+        if fields:
+            top = [name for name in fields if '.' not in name]
+        else:
+            top = [key for key in self.fields if key not in relations]
+        selected = {}
+        for name in top:
+            if name not in self.fields:
+                raise ValueError(f'Unknown field {name!r}')
+            selected[name] = self.fields[name]
+        for name in expand or ():
+            selected[name] = self.fields[name]
+
+        for name in fields or ():
+            if '.' not in name:
+                continue
+            relation, key = name.split('.', 1)
+            if relation not in relations or key not in self.fields[relation]:
+                raise ValueError(f'Unknown field {name!r}')
+            if relation not in (expand or ()):
+                selected.setdefault(relation, {})[key] = self.fields[relation][key]
+
+        # Keep the to_dict() key order whatever order the client asked in
+        return {key: selected[key] for key in self.fields if key in selected}
+
+
+def field_args(args):
+    """Read comma-separated fields= and expand= lists from a request's query string"""
+    def split(name):
+        value = args.get(name, '')
+        return sorted({item.strip() for item in value.split(',') if item.strip()}) or None
+    return split('fields'), split('expand')
+
+
+def _last_seen(user_id, last_seen):
+    # Same as User.last_seen_at: include a value this worker has not flushed yet
+    from app.utils.activity import last_seen_buffer
+    pending = last_seen_buffer.get(user_id)
+    if pending is not None and (last_seen is None or pending > last_seen):
+        last_seen = pending
+    return last_seen.isoformat() if last_seen else None
+
+
+DEVICE_FIELDS = {
+    'id': Device.id,
+    'imei': Device.imei,
+    'brand': Device.brand,
+    'model': Device.model,
+    'purchase_price': Device.purchase_price,
+    'status': Device.status,
+    'arrival_date': Device.arrival_date,
+    'modified_at': Device.modified_at,
+    'notes': Device.notes,
+}
+
+USER_FIELDS = {
+    'id': User.id,
+    'username': User.username,
+    'email': User.email,
+    'role': User.role,
+    'is_active': User.is_active,
+    'created_at': User.created_at,
+    'last_seen': computed(_last_seen, User.id, User.last_seen),
+}
+
+# Money arithmetic as in Sale.to_dict(), which goes through float
+SALE_FIELDS = {
+    'id': Sale.id,
+    'device': DEVICE_FIELDS,
+    'seller': USER_FIELDS,
+    'sale_price': Sale.sale_price,
+    'payment_type': Sale.payment_type,
+    'amount_paid': Sale.amount_paid,
+    'balance_due': computed(lambda price, paid: str(float(price) - float(paid)),
+                            Sale.sale_price, Sale.amount_paid),
+    'profit': computed(lambda price, cost: str(float(price) - float(cost)),
+                       Sale.sale_price, Device.purchase_price),
+    'is_fully_paid': computed(lambda price, paid: float(price) - float(paid) <= 0,
+                              Sale.sale_price, Sale.amount_paid),
+    'sale_date': Sale.sale_date,
+    'modified_at': Sale.modified_at,
+    'notes': Sale.notes,
+}
+
+device_projection = Projection(Device, DEVICE_FIELDS, always=(Device.id, Device.arrival_date))
+sale_projection = Projection(Sale, SALE_FIELDS, joins=(
+    (Device, Device.id == Sale.device_id),
+    (User, User.id == Sale.seller_id),
+), always=(Sale.id, Sale.sale_date))
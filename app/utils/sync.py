@@ -0,0 +1,160 @@
+import base64
+import json
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import event, insert, tuple_
+from sqlalchemy.orm import joinedload, load_only
+from app import db
+from app.models import Device, DeviceTombstone, Sale
+from app.utils.pagination import InvalidCursor
+
+STREAMS = ('devices', 'sales', 'deleted_devices')
+
+
+class WatermarkExpired(ValueError):
+    """Raised when a watermark predates the tombstone retention window"""
+
+
+def encode_watermark(positions):
+    """Encode per-stream sync positions as an opaque URL-safe token.
+
+    A position is (timestamp, id) while a stream is being paged through,
+    or (timestamp, None) once everything up to timestamp has been sent.
+    """
+    payload = json.dumps({
+        stream: [position[0].isoformat(), position[1]]
+        for stream, position in positions.items() if position is not None
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_watermark(token):
+    """Decode a token produced by encode_watermark into per-stream positions"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        positions = dict.fromkeys(STREAMS)
+        for stream, (timestamp, row_id) in payload.items():
+            if stream not in positions:
+                raise ValueError(stream)
+            positions[stream] = (datetime.fromisoformat(timestamp),
+                                 int(row_id) if row_id is not None else None)
+        return positions
+    except (ValueError, TypeError, AttributeError, json.JSONDecodeError) as e:
+        raise InvalidCursor('Invalid watermark') from e
+
+
+def _sale_summary(sale):
+    """Compact sale for terminals, which already hold the device and seller"""
+    return {
+        'id': sale.id,
+        'device_id': sale.device_id,
+        'imei': sale.device.imei,
+        'seller_id': sale.seller_id,
+        'sale_price': str(sale.sale_price),
+        'payment_type': sale.payment_type,
+        'amount_paid': str(sale.amount_paid),
+        'balance_due': str(sale.balance_due),
+        'sale_date': sale.sale_date.isoformat(),
+        'modified_at': sale.modified_at.isoformat(),
+        'notes': sale.notes
+    }
+
+
+def _page(query, timestamp_column, id_column, position, settled, limit):
+    """Next rows of one stream in (timestamp, id) order, after position and up to settled"""
+    query = query.filter(timestamp_column <= settled)
+    if position is not None:
+        timestamp, row_id = position
+        if row_id is None:
+            query = query.filter(timestamp_column > timestamp)
+        else:
+            query = query.filter(tuple_(timestamp_column, id_column) > tuple_(timestamp, row_id))
+    rows = query.order_by(timestamp_column, id_column).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def changes_since(watermark=None, limit=50, settle_seconds=5, retention_days=30, seller_id=None):
+    """Devices and sales written, and devices deleted, since a watermark.
+
+    Each stream is an indexed range scan on (modified_at, id), or
+    (deleted_at, id) for tombstones, of at most ``limit`` rows. Rows
+    written in the last ``settle_seconds`` are held back until the next
+    sync: a transaction still in flight may commit a timestamp older than
+    rows already sent, and would otherwise be skipped for good. With
+    ``seller_id``, only that seller's sales are included.
+    """
+    positions = decode_watermark(watermark) if watermark else dict.fromkeys(STREAMS)
+    now = datetime.utcnow()
+    deleted_position = positions['deleted_devices']
+    if watermark and (deleted_position is None
+                      or deleted_position[0] < now - timedelta(days=retention_days)):
+        raise WatermarkExpired('Watermark is older than the tombstone retention window')
+
+    settled = now - timedelta(seconds=settle_seconds)
+    sales = Sale.query.options(joinedload(Sale.device).options(load_only(Device.imei)))
+    if seller_id is not None:
+        sales = sales.filter(Sale.seller_id == seller_id)
+    streams = {
+        'devices': (Device.query, Device.modified_at, Device.id, Device.to_dict),
+        'sales': (sales, Sale.modified_at, Sale.id, _sale_summary),
+        'deleted_devices': (DeviceTombstone.query, DeviceTombstone.deleted_at,
+                            DeviceTombstone.id, DeviceTombstone.to_dict),
+    }
+
+    result = {}
+    has_more = False
+    for stream, (query, timestamp_column, id_column, serialize) in streams.items():
+        rows, more = _page(query, timestamp_column, id_column, positions[stream], settled, limit)
+        result[stream] = [serialize(row) for row in rows]
+        if more:
+            last = rows[-1]
+            positions[stream] = (getattr(last, timestamp_column.key), last.id)
+            has_more = True
+        else:
+            # Caught up: everything written up to settled has been sent
+            positions[stream] = (settled, None)
+
+    result['watermark'] = encode_watermark(positions)
+    result['has_more'] = has_more
+    return result
+
+
+def record_tombstones_after_flush(session, flush_context):
+    """Record a tombstone for every device deleted in this flush"""
+    now = datetime.utcnow()
+    rows = [{'device_id': obj.id, 'imei': obj.imei, 'deleted_at': now}
+            for obj in session.deleted if isinstance(obj, Device)]
+    if rows:
+        session.connection().execute(insert(DeviceTombstone), rows)
+
+
+def prune_tombstones(retention_days):
+    """Delete tombstones older than the retention window; returns how many went"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = DeviceTombstone.query.filter(DeviceTombstone.deleted_at < cutoff).delete(
+        synchronize_session=False
+    )
+    db.session.commit()
+    return deleted
+
+
+@click.group('sync')
+def sync_cli():
+    """Maintain delta-sync state for POS terminals."""
+
+
+@sync_cli.command('prune')
+@click.option('--days', type=int, default=None, help='Retention in days (default: SYNC_TOMBSTONE_RETENTION_DAYS).')
+def prune_command(days):
+    """Delete device tombstones older than the retention window."""
+    from flask import current_app
+    days = days if days is not None else current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS']
+    click.echo(f'Pruned {prune_tombstones(days)} device tombstones.')
+
+
+def init_sync(app):
+    """Record device tombstones on delete and register CLI commands"""
+    if not event.contains(db.session, 'after_flush', record_tombstones_after_flush):
+        event.listen(db.session, 'after_flush', record_tombstones_after_flush)
+    app.cli.add_command(sync_cli)
@@ -0,0 +1,261 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import jwt
+from flask import current_app, g, request
+from flask_login import UserMixin, current_user
+from sqlalchemy import event, inspect, insert, or_, select
+from app import db, csrf
+
+class TokenUser(UserMixin):
+    """API principal built from verified token claims, without touching the database"""
+
+    def __init__(self, claims):
+        self.id = claims['user_id']
+        self.username = claims.get('username')
+        self.role = claims.get('role')
+        self.claims = claims
+        self._active = bool(claims.get('active'))
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def is_admin(self):
+        # Same check as User.is_admin, so a role stored as 'Admin' behaves alike
+        return str(self.role).lower() == 'admin'
+
+
+class RevocationSet:
+    """Compact set of revoked tokens consulted on every token check.
+
+    Entries are either a token id (logout) or a user id with a cut-off time
+    (deactivation, role or password change: every token of that user issued
+    before the cut-off is rejected). They are stored in token_revocations so
+    every worker sees them; each worker keeps an in-memory copy and pulls new
+    rows at most once per sync interval, so a check never queries the
+    database. Entries are forgotten once every token they cover has expired.
+
+    Ids can commit out of order (a Postgres sequence hands them out at
+    insert, not at commit), so an id below the highest one seen may still
+    turn up. Such gaps are re-read on every sync until they appear or are
+    older than the gap window, after which they are taken to be rolled back.
+    """
+
+    def __init__(self):
+        self.sync_interval = 5
+        self.max_lifetime = timedelta(days=30)
+        self._jtis = {}
+        self._users = {}
+        self.gap_seconds = 60
+        self._last_id = 0
+        # Unseen ids below _last_id, with when the gap was noticed
+        self._missing = {}
+        self._last_sync = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.sync_interval = app.config.get('TOKEN_REVOCATION_SYNC_INTERVAL', 5)
+        self.gap_seconds = app.config.get('TOKEN_REVOCATION_GAP_SECONDS', 60)
+        self.max_lifetime = app.config.get('JWT_REFRESH_TOKEN_EXPIRES', timedelta(days=30))
+
+        for name, listener in (('after_flush', self._track_flush),
+                               ('after_commit', self._after_commit),
+                               ('after_rollback', self._after_rollback)):
+            if not event.contains(db.session, name, listener):
+                event.listen(db.session, name, listener)
+
+    # Write tracking
+
+    def _track_flush(self, session, flush_context):
+        """Revoke the tokens of users whose claims stopped being true in this flush"""
+        from app.models import User
+        user_ids = set()
+        for obj in session.dirty:
+            if not isinstance(obj, User) or obj.id is None:
+                continue
+            attrs = inspect(obj).attrs
+            password_changed = (attrs.password_hash.history.has_changes()
+                                and not obj.__dict__.pop('_password_rehashed', False))
+            if (attrs.role.history.has_changes()
+                    or password_changed
+                    or (attrs.is_active.history.has_changes() and not obj.is_active)):
+                user_ids.add(obj.id)
+        if user_ids:
+            self.revoke_users(user_ids, session=session)
+
+    def _after_commit(self, session):
+        for kind, key, value in session.info.pop('token_revocations', ()):
+            self._remember(kind, key, value)
+
+    def _after_rollback(self, session):
+        session.info.pop('token_revocations', None)
+
+    def _remember(self, kind, key, value):
+        with self._lock:
+            entries = self._jtis if kind == 'jti' else self._users
+            entries[key] = max(entries.get(key, value), value)
+
+    # Revocation
+
+    def revoke_token(self, claims):
+        """Revoke a single token; takes effect when the current transaction commits"""
+        expires_at = datetime.utcfromtimestamp(claims['exp'])
+        db.session.execute(insert(self._table()).values(
+            jti=claims['jti'], revoked_at=time.time(), expires_at=expires_at
+        ))
+        db.session.info.setdefault('token_revocations', []).append(('jti', claims['jti'], claims['exp']))
+
+    def revoke_users(self, user_ids, session=None):
+        """Revoke every token issued so far to the given users; takes effect on commit"""
+        session = session or db.session
+        now = time.time()
+        rows = [{'user_id': user_id, 'revoked_at': now,
+                 'expires_at': datetime.utcnow() + self.max_lifetime} for user_id in user_ids]
+        if not rows:
+            return
+        session.connection().execute(insert(self._table()), rows)
+        session.info.setdefault('token_revocations', []).extend(
+            ('user', user_id, now) for user_id in user_ids
+        )
+
+    # Lookup
+
+    def _table(self):
+        from app.models import TokenRevocation
+        return TokenRevocation.__table__
+
+    def sync(self, force=False):
+        """Pull revocations written by other workers since the last sync"""
+        now = time.monotonic()
+        if not force and self._last_sync is not None and now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+
+        table = self._table()
+        query = select(table.c.id, table.c.jti, table.c.user_id, table.c.revoked_at, table.c.expires_at)
+        new_ids = table.c.id > self._last_id
+        if self._missing:
+            new_ids = or_(new_ids, table.c.id.in_(list(self._missing)))
+        query = query.where(new_ids, table.c.expires_at > datetime.utcnow())
+        with db.engine.connect() as connection:
+            rows = connection.execute(query.order_by(table.c.id)).fetchall()
+
+        seen = set()
+        for row in rows:
+            if row.jti:
+                self._remember('jti', row.jti, row.expires_at.replace(tzinfo=timezone.utc).timestamp())
+            else:
+                self._remember('user', row.user_id, row.revoked_at)
+            seen.add(row.id)
+
+        highest = max(seen, default=self._last_id)
+        # On the first load, ids below the highest are mostly pruned rows, not gaps
+        if self._last_id:
+            for row_id in range(self._last_id + 1, highest):
+                if row_id not in seen:
+                    self._missing[row_id] = now
+        self._last_id = max(self._last_id, highest)
+        self._missing = {row_id: noticed for row_id, noticed in self._missing.items()
+                         if row_id not in seen and now - noticed < self.gap_seconds}
+        self._prune()
+
+    def _prune(self):
+        """Forget entries that can no longer match an unexpired token"""
+        now = time.time()
+        oldest_valid = now - self.max_lifetime.total_seconds()
+        with self._lock:
+            self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+            self._users = {user_id: at for user_id, at in self._users.items() if at > oldest_valid}
+
+    def is_revoked(self, claims):
+        self.sync()
+        if claims.get('jti') in self._jtis:
+            return True
+        cutoff = self._users.get(claims['user_id'])
+        return cutoff is not None and claims['iat'] <= cutoff
+
+    def size(self):
+        return len(self._jtis) + len(self._users)
+
+
+revocations = RevocationSet()
+
+
+def generate_token(user, token_type='access'):
+    """Issue a signed token carrying the claims the API needs to authorise a request"""
+    lifetime_key = 'JWT_REFRESH_TOKEN_EXPIRES' if token_type == 'refresh' else 'JWT_ACCESS_TOKEN_EXPIRES'
+    now = time.time()
+    payload = {
+        'user_id': user.id,
+        'username': user.username,
+        'role': user.role,
+        'active': bool(user.is_active),
+        'type': token_type,
+        'jti': uuid.uuid4().hex,
+        'iat': now,
+        'exp': int(now + current_app.config[lifetime_key].total_seconds())
+    }
+    return jwt.encode(payload, current_app.config['JWT_SECRET_KEY'], algorithm='HS256')
+
+
+def decode_token(token, token_type='access'):
+    """Verify a token and return its claims, or None if it is invalid, expired or revoked"""
+    try:
+        claims = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return None
+    if claims.get('type', 'access') != token_type or 'jti' not in claims:
+        return None
+    if not claims.get('active') or revocations.is_revoked(claims):
+        return None
+    return claims
+
+
+def bearer_token(req=None):
+    """Return the bearer token from the Authorization header, if any"""
+    auth_header = (req or request).headers.get('Authorization', '')
+    parts = auth_header.split()
+    if len(parts) == 2 and parts[0].lower() == 'bearer':
+        return parts[1]
+    return None
+
+
+def user_from_request(req):
+    """Flask-Login request loader: authenticate an API call from its bearer token alone"""
+    # Web views expect an ORM User, so tokens only count on the API blueprints
+    if not (req.blueprint or '').startswith('api_'):
+        return None
+    token = bearer_token(req)
+    if token is None:
+        return None
+    claims = decode_token(token)
+    if not claims:
+        return None
+    g._token_authenticated = True
+    return TokenUser(claims)
+
+
+def _csrf_protect():
+    """CSRF protection for cookie-authenticated requests; bearer tokens are not sent by browsers"""
+    if not current_app.config.get('WTF_CSRF_ENABLED', True) or not request.endpoint:
+        return
+    if bearer_token() is not None:
+        # Skip only when the token itself authenticates the request: a session
+        # cookie wins over the request loader, and an invalid token proves nothing
+        current_user._get_current_object()
+        if g.get('_token_authenticated'):
+            return
+    # Honour csrf.exempt like Flask-WTF's own check does
+    view = current_app.view_functions.get(request.endpoint)
+    if f'{view.__module__}.{view.__name__}' in csrf._exempt_views:
+        return
+    csrf.protect()
+
+
+def init_tokens(app):
+    """Register token revocation tracking and CSRF checks that skip bearer-token requests"""
+    revocations.init_app(app)
+    app.config['WTF_CSRF_CHECK_DEFAULT'] = False
+    app.before_request(_csrf_protect)
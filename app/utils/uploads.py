@@ -0,0 +1,30 @@
+import csv
+import io
+from flask import request
+
+
+class InvalidUpload(ValueError):
+    """Raised when an uploaded file cannot be read as UTF-8 CSV"""
+
+
+def read_rows(key):
+    """Read rows from an uploaded CSV ``file`` or a JSON array.
+
+    The JSON body may be the array itself or an object holding it under
+    ``key``. Returns None when neither is present; raises InvalidUpload
+    for a file that is not UTF-8 or not valid CSV.
+    """
+    upload = request.files.get('file')
+    if upload:
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig')
+        try:
+            return list(csv.DictReader(stream))
+        except UnicodeDecodeError:
+            raise InvalidUpload('CSV file must be UTF-8 encoded')
+        except csv.Error as e:
+            raise InvalidUpload(f'Invalid CSV file: {e}')
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get(key)
+    return data if isinstance(data, list) else None
@@ -0,0 +1,117 @@
+"""Concurrent checkout benchmark for POST /api/sales/sales.
+
+Fires parallel checkouts from several threads, each with its own logged-in
+client, and reports throughput and the conflict rate for two scenarios:
+
+  same       every worker tries to sell the same handsets
+  different  every worker sells its own handsets
+
+Usage:
+    python benchmarks/checkout_concurrency.py [--workers 8] [--devices 50]
+
+Set BENCHMARK_DATABASE_URL to benchmark against an empty Postgres database;
+a throwaway SQLite file is used otherwise.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app import create_app, db
+from benchmarks.common import benchmark_database_url, create_schema
+from app.models import User, Device
+
+
+def make_config(database_url):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        WTF_CSRF_ENABLED = False
+    return BenchmarkConfig
+
+
+def setup_data(app, workers, devices):
+    """Create one staff user per worker and the devices for both scenarios"""
+    with app.app_context():
+        create_schema()
+        for i in range(workers):
+            user = User(username=f'bench{i}', email=f'bench{i}@example.com', role='staff')
+            user.set_password('bench')
+            db.session.add(user)
+        imeis = [f'{i:015d}' for i in range(devices * (workers + 1))]
+        db.session.add_all(Device(imei=imei, brand='Bench', model='Phone', purchase_price=100)
+                           for imei in imeis)
+        db.session.commit()
+    return imeis
+
+
+def run_scenario(app, workers, imei_lists):
+    """Run one checkout round per worker in parallel and tally response codes"""
+    clients = []
+    for i in range(workers):
+        client = app.test_client()
+        client.post('/api/auth/login', json={'username': f'bench{i}', 'password': 'bench'})
+        clients.append(client)
+
+    statuses = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(workers)
+
+    def worker(client, imeis):
+        barrier.wait()
+        local = Counter()
+        for imei in imeis:
+            response = client.post('/api/sales/sales', json={
+                'device_imei': imei,
+                'sale_price': 150,
+                'payment_type': 'cash',
+                'amount_paid': 150
+            })
+            local[response.status_code] += 1
+        with lock:
+            statuses.update(local)
+
+    threads = [threading.Thread(target=worker, args=(client, imeis))
+               for client, imeis in zip(clients, imei_lists)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses, time.perf_counter() - start
+
+
+def report(name, statuses, elapsed):
+    total = sum(statuses.values())
+    print(f'{name:>10}: {total} checkouts in {elapsed:.2f}s '
+          f'({total / elapsed:.0f}/s) | sold={statuses[201]} '
+          f'conflicts={statuses[409]} ({statuses[409] / total:.0%}) '
+          f'other={total - statuses[201] - statuses[409]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--devices', type=int, default=50, help='handsets per scenario per worker')
+    args = parser.parse_args()
+
+    database_url = benchmark_database_url()
+
+    app = create_app(make_config(database_url))
+    imeis = setup_data(app, args.workers, args.devices)
+
+    shared = imeis[:args.devices]
+    statuses, elapsed = run_scenario(app, args.workers, [shared] * args.workers)
+    report('same', statuses, elapsed)
+
+    own = [imeis[args.devices * (i + 1):args.devices * (i + 2)] for i in range(args.workers)]
+    statuses, elapsed = run_scenario(app, args.workers, own)
+    report('different', statuses, elapsed)
+
+
+if __name__ == '__main__':
+    main()
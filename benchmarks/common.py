@@ -0,0 +1,28 @@
+"""Database setup shared by the benchmark scripts.
+
+Benchmarks create and fill their own schema, so they never use the
+application's DATABASE_URL. Set BENCHMARK_DATABASE_URL to benchmark
+against Postgres; a throwaway SQLite file is used otherwise.
+"""
+import os
+import sys
+import tempfile
+from sqlalchemy import inspect
+from app import db
+
+
+def benchmark_database_url():
+    """BENCHMARK_DATABASE_URL, or a fresh SQLite file in a temporary directory"""
+    database_url = os.environ.get('BENCHMARK_DATABASE_URL')
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    return database_url
+
+
+def create_schema():
+    """Create the tables in an empty database; exits rather than touch one that has tables"""
+    tables = inspect(db.engine).get_table_names()
+    if tables:
+        sys.exit(f'Refusing to benchmark against {db.engine.url.render_as_string()}: it already has '
+                 f'{len(tables)} tables. Point BENCHMARK_DATABASE_URL at an empty database.')
+    db.create_all()
@@ -0,0 +1,142 @@
+"""Dashboard aggregation benchmark: separate metric queries against dashboard_totals().
+
+Seeds a sales history (1M sales by default) and its daily rollup, then
+times the headline dashboard metrics computed the old way, one query per
+metric, and with the single conditional-aggregation query, reporting
+database round trips and latency for each. The full cached dashboard
+payload (_dashboard_data) is timed too.
+
+Usage:
+    python benchmarks/dashboard.py [--sales 1000000] [--days 730] [--repeat 5]
+
+Set BENCHMARK_DATABASE_URL to benchmark against an empty Postgres database;
+a throwaway SQLite file is used otherwise.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, insert
+from config import Config
+from app import create_app, db
+from benchmarks.common import benchmark_database_url, create_schema
+from app.models import Device, Sale, User, DailySalesRollup
+from app.routes.reports.routes import _dashboard_data
+from app.utils.rollups import dashboard_totals, rebuild_daily_rollups, rollup_totals, outstanding_credit
+
+CHUNK = 50000
+
+
+def make_config(database_url):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        BCRYPT_LOG_ROUNDS = 4
+        REPORT_CACHE_BACKEND = 'none'
+    return BenchmarkConfig
+
+
+def setup_data(app, sales, days):
+    """One device per sale plus 10% unsold stock, sales spread over the last `days` days"""
+    random.seed(42)
+    with app.app_context():
+        create_schema()
+        sellers = []
+        for i in range(10):
+            user = User(username=f'seller{i}', email=f'seller{i}@example.com', role='staff')
+            user.set_password('bench')
+            db.session.add(user)
+            sellers.append(user)
+        db.session.commit()
+        seller_ids = [user.id for user in sellers]
+
+        devices = sales + sales // 10
+        now = datetime.utcnow()
+        for start in range(0, devices, CHUNK):
+            db.session.execute(insert(Device), [{
+                'imei': f'35{i:013d}', 'brand': f'Brand{i % 20}', 'model': f'Model{i % 300}',
+                'purchase_price': 100 + i % 50, 'status': 'sold' if i < sales else 'available'
+            } for i in range(start, min(start + CHUNK, devices))])
+        for start in range(0, sales, CHUNK):
+            db.session.execute(insert(Sale), [{
+                'device_id': i + 1, 'seller_id': seller_ids[i % len(seller_ids)],
+                'sale_price': 150 + i % 80, 'payment_type': 'credit' if i % 3 == 0 else 'cash',
+                'amount_paid': 150 + i % 80 - (i % 40 if i % 3 == 0 else 0),
+                'sale_date': now - timedelta(minutes=random.randrange(days * 24 * 60))
+            } for i in range(start, min(start + CHUNK, sales))])
+        db.session.commit()
+        rebuild_daily_rollups()
+        return DailySalesRollup.query.count()
+
+
+def separate_queries(today, days=30):
+    """The dashboard metrics as they were computed before dashboard_totals()"""
+    current_start = today - timedelta(days=days)
+    current = rollup_totals(date_from=current_start)
+    previous = rollup_totals(date_from=current_start - timedelta(days=days), date_to=current_start)
+    payment_counts = dict(db.session.query(
+        DailySalesRollup.payment_type,
+        func.sum(DailySalesRollup.sales_count)
+    ).group_by(DailySalesRollup.payment_type).all())
+    return {
+        'total_sales': current.total_sales,
+        'previous_sales': previous.total_sales,
+        'available_devices': Device.query.filter_by(status='available').count(),
+        'outstanding_credit': float(outstanding_credit()),
+        'cash_sales': payment_counts.get('cash', 0),
+        'credit_sales': payment_counts.get('credit', 0)
+    }
+
+
+def measure(app, function, repeat):
+    """Median latency and round trips per call"""
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    timings = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            function()  # warm the page cache
+            statements.clear()
+            for _ in range(repeat):
+                start = time.perf_counter()
+                function()
+                timings.append(time.perf_counter() - start)
+                db.session.remove()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+    return statistics.median(timings), len(statements) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sales', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=730, help='days of history to spread sales over')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    database_url = benchmark_database_url()
+
+    app = create_app(make_config(database_url))
+    start = time.perf_counter()
+    rollup_rows = setup_data(app, args.sales, args.days)
+    print(f'seeded {args.sales:,} sales ({rollup_rows:,} rollup rows) in {time.perf_counter() - start:.0f}s')
+
+    today = datetime.utcnow().date()
+    for name, function in (('separate queries', lambda: separate_queries(today)),
+                           ('dashboard_totals', lambda: dashboard_totals(today)),
+                           ('full dashboard data', lambda: _dashboard_data(today))):
+        elapsed, round_trips = measure(app, function, args.repeat)
+        print(f'{name:<20} {round_trips:>4.0f} round trips | {elapsed * 1000:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Login throughput benchmark for POST /api/auth/login at several bcrypt costs.
+
+Simulates a shift-change login burst: several threads log in at once, each
+with its own client, and the script reports logins per second and latency
+percentiles for every cost. A cheap GET runs alongside the burst to show
+how much the hashing delays other requests.
+
+Usage:
+    python benchmarks/login_throughput.py [--threads 8] [--logins 5] [--costs 4,8,10,12]
+                                          [--pool-workers 4]
+
+Set BENCHMARK_DATABASE_URL to benchmark against an empty Postgres database;
+a throwaway SQLite file is used otherwise.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app import create_app, db
+from benchmarks.common import benchmark_database_url, create_schema
+from app.models import User
+
+
+def make_config(database_url, cost, pool_workers):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        WTF_CSRF_ENABLED = False
+        API_AUTH_MODE = 'token'
+        BCRYPT_LOG_ROUNDS = cost
+        PASSWORD_HASH_WORKERS = pool_workers
+    return BenchmarkConfig
+
+
+def setup_users(app, count):
+    """Create one user per login thread, hashed at the configured cost"""
+    with app.app_context():
+        create_schema()
+        for i in range(count):
+            user = User(username=f'bench{i}', email=f'bench{i}@example.com', role='staff')
+            user.set_password('bench')
+            db.session.add(user)
+        db.session.commit()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_burst(app, threads, logins):
+    """Log in from every thread at once while a probe thread times a cheap request"""
+    latencies = []
+    probe_latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+    done = threading.Event()
+
+    def worker(index):
+        client = app.test_client()
+        barrier.wait()
+        local = []
+        for _ in range(logins):
+            start = time.perf_counter()
+            response = client.post('/api/auth/login', json={'username': f'bench{index}', 'password': 'bench'})
+            local.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+        with lock:
+            latencies.extend(local)
+
+    def probe():
+        client = app.test_client()
+        barrier.wait()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/auth/login')
+            probe_latencies.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    prober = threading.Thread(target=probe)
+    start = time.perf_counter()
+    for thread in workers + [prober]:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+    return latencies, probe_latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=5, help='logins per thread')
+    parser.add_argument('--costs', default='4,8,10,12', help='comma-separated bcrypt costs')
+    parser.add_argument('--pool-workers', type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    database_url = benchmark_database_url()
+
+    for cost in (int(cost) for cost in args.costs.split(',')):
+        app = create_app(make_config(database_url, cost, args.pool_workers))
+        setup_users(app, args.threads)
+        latencies, probes, elapsed = run_burst(app, args.threads, args.logins)
+        print(f'cost {cost:>2}: {len(latencies)} logins in {elapsed:.2f}s '
+              f'({len(latencies) / elapsed:.1f}/s) | login p50={statistics.median(latencies) * 1000:.0f}ms '
+              f'p95={percentile(latencies, 0.95) * 1000:.0f}ms | '
+              f'other requests p95={percentile(probes, 0.95) * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""List serialization benchmark: ORM to_dict() against column projections.
+
+Loads a page of devices and of sales (with device and seller) both ways,
+as the list endpoints do, and reports rows per second and peak Python
+memory for each path. Each run uses a fresh session so the identity map
+starts empty, as it does for a request.
+
+Usage:
+    python benchmarks/serialization.py [--rows 20000] [--repeat 3]
+
+Set BENCHMARK_DATABASE_URL to benchmark against an empty Postgres database;
+a throwaway SQLite file is used otherwise.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from config import Config
+from app import create_app, db
+from benchmarks.common import benchmark_database_url, create_schema
+from app.models import Device, Sale, User
+from app.utils.serializers import device_projection, sale_projection
+
+
+def make_config(database_url):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        BCRYPT_LOG_ROUNDS = 4
+    return BenchmarkConfig
+
+
+def setup_data(app, rows):
+    """One device per row, every device sold by one of a few sellers"""
+    with app.app_context():
+        create_schema()
+        sellers = []
+        for i in range(5):
+            user = User(username=f'seller{i}', email=f'seller{i}@example.com', role='staff')
+            user.set_password('bench')
+            db.session.add(user)
+            sellers.append(user)
+        db.session.commit()
+
+        start = datetime(2024, 1, 1)
+        db.session.execute(insert(Device), [{
+            'imei': f'35{i:013d}', 'brand': f'Brand{i % 20}', 'model': f'Model{i % 200}',
+            'purchase_price': 100 + i % 50, 'status': 'sold', 'arrival_date': start + timedelta(minutes=i),
+            'notes': 'Bench device' if i % 3 == 0 else None
+        } for i in range(rows)])
+        db.session.execute(insert(Sale), [{
+            'device_id': i + 1, 'seller_id': sellers[i % len(sellers)].id, 'sale_price': 150 + i % 80,
+            'payment_type': 'cash' if i % 2 else 'credit', 'amount_paid': 120 + i % 80,
+            'sale_date': start + timedelta(minutes=i, seconds=30)
+        } for i in range(rows)])
+        db.session.commit()
+
+
+def orm_devices(rows):
+    return [device.to_dict() for device in Device.query.order_by(Device.id).limit(rows).all()]
+
+
+def projection_devices(rows):
+    return device_projection.encode_all(device_projection.query().order_by(Device.id).limit(rows).all())
+
+
+def orm_sales(rows):
+    return [sale.to_dict() for sale in Sale.query_with_relations().order_by(Sale.id).limit(rows).all()]
+
+
+def projection_sales(rows):
+    return sale_projection.encode_all(sale_projection.query().order_by(Sale.id).limit(rows).all())
+
+
+def measure(app, function, rows, repeat):
+    """Best time and peak traced memory over several runs"""
+    best = None
+    for _ in range(repeat):
+        with app.app_context():
+            start = time.perf_counter()
+            function(rows)
+            elapsed = time.perf_counter() - start
+            db.session.remove()
+        best = elapsed if best is None else min(best, elapsed)
+
+    with app.app_context():
+        tracemalloc.start()
+        function(rows)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        db.session.remove()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    database_url = benchmark_database_url()
+
+    app = create_app(make_config(database_url))
+    setup_data(app, args.rows)
+
+    for name, function in (('devices to_dict', orm_devices), ('devices projection', projection_devices),
+                           ('sales to_dict', orm_sales), ('sales projection', projection_sales)):
+        elapsed, peak = measure(app, function, args.rows, args.repeat)
+        print(f'{name:<20} {args.rows / elapsed:>10,.0f} rows/s | {elapsed * 1000:>7.0f}ms | '
+              f'peak {peak / 1e6:>6.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
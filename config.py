@@ -13,4 +13,82 @@ class Config:
     # JWT configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-dev-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
-    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
\ No newline at end of file
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # 'token' makes API login stateless (no session cookie); 'session' also logs the client in
+    API_AUTH_MODE = os.environ.get('API_AUTH_MODE', 'session')
+    # Seconds between each worker's pulls of new token revocations
+    TOKEN_REVOCATION_SYNC_INTERVAL = float(os.environ.get('TOKEN_REVOCATION_SYNC_INTERVAL', 5))
+    # How long an id skipped by a later commit is re-read before it is taken as rolled back
+    TOKEN_REVOCATION_GAP_SECONDS = float(os.environ.get('TOKEN_REVOCATION_GAP_SECONDS', 60))
+
+    # bcrypt cost (log2 rounds); stored hashes are re-hashed on login when it changes
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    # Threads verifying passwords concurrently per worker
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 4))
+    # Processes hashing passwords during bulk user imports
+    PASSWORD_HASH_PROCESSES = int(os.environ.get('PASSWORD_HASH_PROCESSES', os.cpu_count() or 4))
+    USER_IMPORT_MAX_ROWS = int(os.environ.get('USER_IMPORT_MAX_ROWS', 1000))
+
+    # API pagination
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 500))
+
+    # Delta sync for POS terminals; rows younger than the settle window wait
+    # for the next sync so in-flight transactions are not skipped
+    SYNC_SETTLE_SECONDS = int(os.environ.get('SYNC_SETTLE_SECONDS', 5))
+    SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+    # Streaming exports: rows fetched from the database per chunk
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+
+    # Bulk device intake
+    BULK_INTAKE_MAX_ROWS = int(os.environ.get('BULK_INTAKE_MAX_ROWS', 10000))
+    BULK_INTAKE_CHUNK_SIZE = int(os.environ.get('BULK_INTAKE_CHUNK_SIZE', 500))
+
+    # Device search: broader queries than this are listed newest first instead of ranked
+    SEARCH_RANK_LIMIT = int(os.environ.get('SEARCH_RANK_LIMIT', 2000))
+
+    # Partial IMEI lookup at the counter
+    IMEI_SUFFIX_MIN_DIGITS = int(os.environ.get('IMEI_SUFFIX_MIN_DIGITS', 4))
+    IMEI_SUFFIX_MAX_MATCHES = int(os.environ.get('IMEI_SUFFIX_MAX_MATCHES', 10))
+
+    # Multi-device checkout
+    CHECKOUT_MAX_ITEMS = int(os.environ.get('CHECKOUT_MAX_ITEMS', 200))
+
+    # Trend reports: day, week and month boundaries fall at midnight in this time zone
+    STORE_TIMEZONE = os.environ.get('STORE_TIMEZONE', 'UTC')
+    # Longest trend series served, e.g. about 83 days of hourly buckets
+    TREND_MAX_BUCKETS = int(os.environ.get('TREND_MAX_BUCKETS', 2000))
+
+    # gunicorn worker processes; gunicorn reads the same variable as its --workers default
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+    # Caches: backend is 'local' (per worker), 'redis' (shared across workers) or 'none'
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    # With several workers, 'local' reports can lag another worker's writes by up
+    # to REPORT_CACHE_TTL; set REPORT_CACHE_BACKEND=redis where that matters
+    REPORT_CACHE_BACKEND = os.environ.get('REPORT_CACHE_BACKEND', 'local')
+    REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 256))
+    REPORT_CACHE_TTL = int(os.environ.get('REPORT_CACHE_TTL', 300))
+    # The user cache backs the login check, so a deactivated or demoted user must
+    # drop out everywhere at once: 'local' is refused with more than one worker
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'none')
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 1024))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    # Seconds the approximate total on the users page is reused by each worker
+    USER_COUNT_CACHE_TTL = int(os.environ.get('USER_COUNT_CACHE_TTL', 30))
+    DEVICE_CACHE_BACKEND = os.environ.get('DEVICE_CACHE_BACKEND', 'local')
+    DEVICE_CACHE_MAX_ENTRIES = int(os.environ.get('DEVICE_CACHE_MAX_ENTRIES', 512))
+    DEVICE_CACHE_TTL = int(os.environ.get('DEVICE_CACHE_TTL', 30))
+
+    # last_seen write-behind: pending timestamps are written at most this many seconds late
+    LAST_SEEN_FLUSH_INTERVAL = float(os.environ.get('LAST_SEEN_FLUSH_INTERVAL', 30))
+    LAST_SEEN_MAX_PENDING = int(os.environ.get('LAST_SEEN_MAX_PENDING', 1000))
+    LAST_SEEN_TRACK_REQUESTS = os.environ.get('LAST_SEEN_TRACK_REQUESTS', 'true').lower() == 'true'
+
+    # Request metrics; set METRICS_DIR to a directory shared by all gunicorn workers
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    # /metrics is only served when this is set, to scrapers sending it as a bearer token
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    SQL_METRICS_HEADER = os.environ.get('SQL_METRICS_HEADER', '').lower() in ('1', 'true', 'yes')
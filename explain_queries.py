@@ -0,0 +1,124 @@
+from app import create_app, db
+from app.models import Sale, Device
+from sqlalchemy import create_engine, func, text
+from datetime import datetime, timedelta
+import sys
+
+# Indexes added by the "report and listing indexes" and "outstanding sales index" migrations
+REPORT_INDEXES = [
+    'ix_devices_arrival_date_id',
+    'ix_devices_status_arrival_date',
+    'ix_devices_brand_arrival_date',
+    'ix_devices_brand_model_covering',
+    'ix_sales_sale_date_id',
+    'ix_sales_sale_date_covering',
+    'ix_sales_seller_id_sale_date',
+    'ix_sales_payment_type_sale_date',
+    'ix_sales_outstanding',
+]
+
+def report_queries():
+    """Build the hot dashboard, report and listing queries"""
+    date_from = datetime.utcnow() - timedelta(days=30)
+    previous_from = date_from - timedelta(days=30)
+
+    return {
+        'sales summary (api/reports summary)': db.session.query(
+            func.count(Sale.id),
+            func.sum(Sale.sale_price),
+            func.sum(Sale.sale_price - Device.purchase_price)
+        ).join(Device).filter(Sale.sale_date >= date_from),
+        'previous period count (reports.dashboard)': db.session.query(
+            func.count(Sale.id)
+        ).filter(Sale.sale_date >= previous_from, Sale.sale_date < date_from),
+        'outstanding credit': db.session.query(
+            func.sum(Sale.balance_due)
+        ).filter(~Sale.is_fully_paid),
+        'available devices': db.session.query(
+            func.count(Device.id)
+        ).filter(Device.status == 'available'),
+        'staff performance': db.session.query(
+            func.count(Sale.id),
+            func.sum(Sale.sale_price)
+        ).filter(Sale.seller_id == 1, Sale.sale_date >= date_from),
+        'payment breakdown': db.session.query(
+            Sale.payment_type,
+            func.count(Sale.id)
+        ).filter(Sale.sale_date >= date_from).group_by(Sale.payment_type),
+        'daily trend': db.session.query(
+            func.date(Sale.sale_date),
+            func.count(Sale.id)
+        ).filter(Sale.sale_date >= date_from).group_by(func.date(Sale.sale_date)),
+        'inventory by brand/model': db.session.query(
+            Device.brand,
+            Device.model,
+            func.count(Device.id),
+            func.avg(Device.purchase_price)
+        ).group_by(Device.brand, Device.model),
+        'who owes us money': Sale.query.filter(~Sale.is_fully_paid).order_by(
+            Sale.sale_date.desc(), Sale.id.desc()
+        ).limit(50),
+        'recent sales': Sale.query.order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(5),
+        'device listing by status': Device.query.filter_by(status='available').order_by(
+            Device.arrival_date.desc(), Device.id.desc()
+        ).limit(50),
+    }
+
+def explain(connection, query):
+    """Return the query plan lines for a query on the given connection"""
+    sql = str(query.statement.compile(
+        dialect=connection.dialect,
+        compile_kwargs={'literal_binds': True}
+    ))
+    if connection.dialect.name == 'sqlite':
+        rows = connection.execute(text('EXPLAIN QUERY PLAN ' + sql)).fetchall()
+        return [row[-1] for row in rows]
+    rows = connection.execute(text('EXPLAIN ' + sql)).fetchall()
+    return [row[0] for row in rows]
+
+def is_full_scan(line):
+    """Check whether a plan line reads a whole table"""
+    if 'Seq Scan' in line:
+        return True
+    return line.startswith('SCAN ') and 'INDEX' not in line
+
+def print_plans(connection, title):
+    print(f'===== {title} ({connection.dialect.name}) =====')
+    full_scans = 0
+    for name, query in report_queries().items():
+        print(f'-- {name}')
+        for line in explain(connection, query):
+            marker = '  !! ' if is_full_scan(line) else '     '
+            full_scans += is_full_scan(line)
+            print(marker + line)
+    print(f'Full table scans: {full_scans}\n')
+
+def main():
+    """Print query plans for the report queries.
+
+    Without arguments the plans come from the configured database, so run it
+    before and after `flask db upgrade`. With --compare a scratch in-memory
+    SQLite schema is built from the models and the plans are printed with
+    and without the report indexes.
+    """
+    app = create_app()
+    with app.app_context():
+        if '--compare' not in sys.argv:
+            with db.engine.connect() as connection:
+                print_plans(connection, 'current database')
+            return
+
+        engine = create_engine('sqlite://')
+        db.metadata.create_all(engine)
+        indexes = [index for table in db.metadata.sorted_tables
+                   for index in table.indexes if index.name in REPORT_INDEXES]
+        with engine.connect() as connection:
+            for index in indexes:
+                index.drop(connection)
+            print_plans(connection, 'before')
+            for index in indexes:
+                index.create(connection)
+            print_plans(connection, 'after')
+
+if __name__ == '__main__':
+    main()
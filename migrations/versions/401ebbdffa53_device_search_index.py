@@ -0,0 +1,62 @@
+"""device search index
+
+Revision ID: 401ebbdffa53
+Revises: 8f3102f846e0
+Create Date: 2026-10-18 03:52:50.099022
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '401ebbdffa53'
+down_revision = '8f3102f846e0'
+branch_labels = None
+depends_on = None
+
+
+# FTS5 index over device brand, model and notes, kept in sync by triggers.
+# SQLite only; other databases fall back to LIKE matching.
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS devices_fts USING fts5("
+    "brand, model, notes, content='devices', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS devices_fts_insert AFTER INSERT ON devices BEGIN "
+    "INSERT INTO devices_fts(rowid, brand, model, notes) "
+    "VALUES (new.id, new.brand, new.model, new.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS devices_fts_delete AFTER DELETE ON devices BEGIN "
+    "INSERT INTO devices_fts(devices_fts, rowid, brand, model, notes) "
+    "VALUES ('delete', old.id, old.brand, old.model, old.notes); END",
+    "CREATE TRIGGER IF NOT EXISTS devices_fts_update AFTER UPDATE OF brand, model, notes ON devices BEGIN "
+    "INSERT INTO devices_fts(devices_fts, rowid, brand, model, notes) "
+    "VALUES ('delete', old.id, old.brand, old.model, old.notes); "
+    "INSERT INTO devices_fts(rowid, brand, model, notes) "
+    "VALUES (new.id, new.brand, new.model, new.notes); END",
+]
+
+
+def fts5_available(bind):
+    if bind.dialect.name != 'sqlite':
+        return False
+    options = {row[0] for row in bind.execute(sa.text('PRAGMA compile_options'))}
+    return 'ENABLE_FTS5' in options
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not fts5_available(bind):
+        return
+    for statement in FTS_DDL:
+        op.execute(statement)
+    # Index the devices that already exist
+    op.execute("INSERT INTO devices_fts(devices_fts) VALUES('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TRIGGER IF EXISTS devices_fts_update')
+    op.execute('DROP TRIGGER IF EXISTS devices_fts_delete')
+    op.execute('DROP TRIGGER IF EXISTS devices_fts_insert')
+    op.execute('DROP TABLE IF EXISTS devices_fts')
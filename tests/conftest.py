@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app import create_app, db
+from app.models import User
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+    BCRYPT_LOG_ROUNDS = 4
+    REPORT_CACHE_BACKEND = 'none'
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        for username, role in (('admin', 'admin'), ('staff', 'staff')):
+            user = User(username=username, email=f'{username}@example.com', role=role)
+            user.set_password('password')
+            db.session.add(user)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def login(client, username):
+    response = client.post('/api/auth/login', json={'username': username, 'password': 'password'})
+    assert response.status_code == 200
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    return login(app.test_client(), 'admin')
@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+from app.models import Device
+
+
+def upload(client, url, content):
+    return client.post(url, data={'file': (io.BytesIO(content), 'rows.csv')},
+                       content_type='multipart/form-data')
+
+
+def test_bulk_devices_csv(admin_client):
+    content = 'imei,brand,model,purchase_price\n350000000000001,Apple,iPhone 15,500\n'.encode('utf-8-sig')
+    response = upload(admin_client, '/api/devices/devices/bulk', content)
+    assert response.status_code in (200, 201)
+    assert Device.query.filter_by(imei='350000000000001').count() == 1
+
+
+@pytest.mark.parametrize('content', [b'\xff\xfei\x00m\x00e\x00i\x00', b'imei,brand\n' + b'3' * 200000 + b',Apple\n'])
+def test_bulk_devices_rejects_unreadable_csv(admin_client, content):
+    response = upload(admin_client, '/api/devices/devices/bulk', content)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_user_import_rejects_non_utf8_csv(admin_client):
+    response = upload(admin_client, '/auth/users/import', b'\xff\xfeu\x00s\x00e\x00r\x00')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_bulk_devices_accepts_zero_price_and_rejects_negative(admin_client):
+    response = admin_client.post('/api/devices/devices/bulk', json={'devices': [
+        {'imei': '350000000000001', 'brand': 'Apple', 'model': 'iPhone 15', 'purchase_price': 0},
+        {'imei': '350000000000002', 'brand': 'Apple', 'model': 'iPhone 15', 'purchase_price': -1},
+        {'imei': '350000000000003', 'brand': 'Apple', 'model': 'iPhone 15', 'purchase_price': ''},
+    ]})
+    assert Device.query.filter_by(imei='350000000000001').count() == 1
+    errors = [row.get('error') for row in response.get_json()['results']]
+    assert errors[0] is None
+    assert errors[1] == 'Invalid purchase price'
+    assert errors[2] == 'Missing required fields: purchase_price'
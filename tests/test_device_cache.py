@@ -0,0 +1,30 @@
+"""A device cached by this worker may be edited through another one"""
+from flask import g
+
+from app import db
+from app.models import DailySalesRollup, Device
+
+IMEI = '350000000000001'
+
+
+def test_sale_uses_the_current_device_row_not_the_cached_one(admin_client):
+    db.session.add(Device(imei=IMEI, brand='Apple', model='iPhone 15', purchase_price=100))
+    db.session.commit()
+    # Warm this worker's cache
+    assert admin_client.get(f'/api/devices/devices/{IMEI}').status_code == 200
+    # Another worker's edit: not seen by this worker's cache invalidation
+    db.session.execute(db.text("UPDATE devices SET purchase_price = 180, brand = 'Samsung' WHERE imei = :imei"),
+                       {'imei': IMEI})
+    db.session.commit()
+    # The test client shares one app context; start the next request afresh
+    for device in [obj for obj in db.session if isinstance(obj, Device)]:
+        db.session.expunge(device)
+    g.pop('_device_lookups', None)
+
+    response = admin_client.post('/api/sales/sales', json={
+        'device_imei': IMEI, 'sale_price': 300, 'payment_type': 'cash', 'amount_paid': 300})
+    assert response.status_code == 201
+    assert float(response.get_json()['profit']) == 120.0
+
+    rollup = DailySalesRollup.query.one()
+    assert (rollup.brand, float(rollup.cost)) == ('Samsung', 180.0)
@@ -0,0 +1,47 @@
+import json
+
+from app import create_app
+from tests.conftest import TestConfig
+
+
+def make_app(tmp_path, token='scrape-token'):
+    class MetricsConfig(TestConfig):
+        METRICS_DIR = str(tmp_path)
+        METRICS_TOKEN = token
+    return create_app(MetricsConfig)
+
+
+def test_metrics_needs_the_token(tmp_path):
+    client = make_app(tmp_path).test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'}).status_code == 200
+
+
+def test_metrics_disabled_without_a_token(tmp_path):
+    assert make_app(tmp_path, token=None).test_client().get('/metrics').status_code == 404
+
+
+def scrape(app):
+    response = app.test_client().get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    return response.get_data(as_text=True)
+
+
+def requests_total(text, endpoint):
+    prefix = f'http_requests_total{{endpoint="{endpoint}",method="GET",status="200"}} '
+    return sum(int(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix))
+
+
+def test_exited_worker_totals_are_kept(tmp_path):
+    app = make_app(tmp_path)
+    snapshot = {'histograms': {}, 'counters': {'http_requests_total': [[['index', 'GET', '200'], 1000]]}}
+    # Far above any pid_max, so no live process has it
+    dead = tmp_path / 'metrics-999999999.json'
+    dead.write_text(json.dumps(snapshot))
+    assert requests_total(scrape(app), 'index') == 1000
+    assert not dead.exists()
+
+    # Archived once: later scrapes neither drop nor double count it
+    assert requests_total(scrape(app), 'index') == 1000
+    dead.write_text(json.dumps(snapshot))
+    assert requests_total(scrape(app), 'index') == 2000
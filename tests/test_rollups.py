@@ -0,0 +1,58 @@
+"""The incrementally maintained daily rollup must match a rebuild from the sales table"""
+from datetime import datetime
+from decimal import Decimal
+
+from app import db
+from app.models import DailySalesRollup, Device, Sale
+from app.utils.rollups import rebuild_daily_rollups
+
+
+def rollup_rows():
+    rows = db.session.query(DailySalesRollup).order_by(
+        DailySalesRollup.day, DailySalesRollup.brand, DailySalesRollup.model).all()
+    return [(row.day, row.seller_id, row.brand, row.model, row.payment_type, row.sales_count,
+             Decimal(row.revenue), Decimal(row.cost), Decimal(row.amount_paid)) for row in rows]
+
+
+def assert_matches_rebuild():
+    maintained = rollup_rows()
+    rebuild_daily_rollups()
+    assert maintained == rollup_rows()
+    return maintained
+
+
+def sell(imei, brand='Apple', price=500):
+    device = Device(imei=imei, brand=brand, model='iPhone 15', purchase_price=price, status='sold')
+    sale = Sale(device=device, seller_id=1, sale_price=800, payment_type='credit', amount_paid=300,
+                sale_date=datetime(2024, 5, 1, 10))
+    db.session.add_all([device, sale])
+    db.session.commit()
+    return device, sale
+
+
+def test_sold_device_edit_moves_rollup_totals(admin_client):
+    sell('350000000000001')
+    sell('350000000000002')
+    response = admin_client.put('/api/devices/devices/350000000000001',
+                                json={'brand': 'Samsung', 'purchase_price': 650})
+    assert response.status_code == 200
+    rows = assert_matches_rebuild()
+    assert [(row[2], row[5], row[7]) for row in rows] == [('Apple', 1, 500), ('Samsung', 1, 650)]
+
+
+def test_last_sale_moved_out_removes_rollup_row(app):
+    device, _ = sell('350000000000001')
+    device.model = 'iPhone 16'
+    db.session.commit()
+    rows = assert_matches_rebuild()
+    assert [row[3] for row in rows] == ['iPhone 16']
+
+
+def test_device_and_sale_edited_in_one_flush(app):
+    device, sale = sell('350000000000001')
+    device.brand = 'Samsung'
+    device.purchase_price = 400
+    sale.sale_price = 900
+    sale.amount_paid = 900
+    db.session.commit()
+    assert_matches_rebuild()
@@ -0,0 +1,46 @@
+"""Sale listings must cost the same number of queries however many sales they show"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from app import db
+from app.models import Device, Sale
+
+
+def add_sales(count, offset=0):
+    start = datetime(2024, 1, 1)
+    db.session.execute(insert(Device), [{
+        'imei': f'35{i:013d}', 'brand': 'Apple', 'model': f'Model{i % 3}',
+        'purchase_price': 100, 'status': 'sold'
+    } for i in range(offset, offset + count)])
+    db.session.execute(insert(Sale), [{
+        'device_id': i + 1, 'seller_id': 1 + i % 2, 'sale_price': 150,
+        'payment_type': 'cash', 'amount_paid': 150, 'sale_date': start + timedelta(hours=i)
+    } for i in range(offset, offset + count)])
+    db.session.commit()
+
+
+def count_queries(client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    client.get(url)  # warm up per-session lookups
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('url', ['/api/sales/sales', '/sales/'])
+def test_sale_listing_query_count_is_constant(admin_client, url):
+    add_sales(3)
+    few = count_queries(admin_client, url)
+    add_sales(30, offset=3)
+    many = count_queries(admin_client, url)
+    assert few == many
@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Device, Sale
+from tests.conftest import login
+
+
+def test_staff_sync_only_returns_own_sales(app):
+    app.config['SYNC_SETTLE_SECONDS'] = 0
+    written = datetime.utcnow() - timedelta(minutes=1)
+    for seller_id, imei in ((1, '350000000000001'), (2, '350000000000002')):
+        device = Device(imei=imei, brand='Apple', model='iPhone 15', purchase_price=500, status='sold')
+        db.session.add(Sale(device=device, seller_id=seller_id, sale_price=800, payment_type='cash',
+                            amount_paid=800, sale_date=written, modified_at=written))
+    db.session.commit()
+
+    staff = login(app.test_client(), 'staff')
+    sales = staff.get('/api/sync/changes').get_json()['sales']
+    assert {sale['imei'] for sale in sales} == {'350000000000002'}
+
+    admin = login(app.test_client(), 'admin')
+    assert len(admin.get('/api/sync/changes').get_json()['sales']) == 2
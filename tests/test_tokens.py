@@ -0,0 +1,64 @@
+import time
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Device, User
+from app.utils.tokens import TokenUser, generate_token
+
+DEVICE = {'imei': '350000000000001', 'brand': 'Apple', 'model': 'iPhone 15', 'purchase_price': 500}
+
+
+def test_invalid_bearer_does_not_skip_csrf_for_a_session(app, admin_client):
+    app.config['WTF_CSRF_ENABLED'] = True
+    response = admin_client.post('/api/devices/devices', json=DEVICE,
+                                 headers={'Authorization': 'Bearer not-a-token'})
+    assert response.status_code == 400
+
+
+def test_valid_bearer_skips_csrf(app):
+    app.config['WTF_CSRF_ENABLED'] = True
+    token = generate_token(db.session.get(User, 1))
+    response = app.test_client().post('/api/devices/devices', json=DEVICE,
+                                      headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 201
+
+
+def test_token_user_role_check_matches_user():
+    claims = {'user_id': 1, 'role': 'Admin', 'active': True}
+    assert TokenUser(claims).is_admin() == User(role='Admin').is_admin() is True
+
+
+def test_bearer_token_does_not_log_in_web_views(app):
+    staff = db.session.get(User, 2)
+    headers = {'Authorization': f'Bearer {generate_token(staff)}'}
+    db.session.add(Device(**DEVICE))
+    db.session.commit()
+    client = app.test_client()
+
+    assert client.get('/auth/profile', headers=headers).status_code == 302
+    response = client.post('/sales/create', headers=headers, data={
+        'imei': DEVICE['imei'], 'sale_price': 800, 'payment_type': 'cash', 'amount_paid': 800})
+    assert response.status_code == 302
+    assert Device.query.filter_by(imei=DEVICE['imei']).one().status == 'available'
+
+
+def test_revocation_committed_out_of_id_order_is_synced(app):
+    from app.models import TokenRevocation
+    from app.utils.tokens import RevocationSet
+
+    revocations = RevocationSet()
+    revocations.init_app(app)
+    expires_at = datetime.utcnow() + timedelta(days=1)
+    db.session.add(TokenRevocation(id=1, jti='b' * 32, revoked_at=time.time(), expires_at=expires_at))
+    db.session.commit()
+    revocations.sync(force=True)
+    # Id 3 commits first; id 2 was handed out earlier but commits after the next sync
+    db.session.add(TokenRevocation(id=3, jti='c' * 32, revoked_at=time.time(), expires_at=expires_at))
+    db.session.commit()
+    revocations.sync(force=True)
+    db.session.add(TokenRevocation(id=2, user_id=2, revoked_at=time.time(), expires_at=expires_at))
+    db.session.commit()
+    revocations.sync(force=True)
+
+    claims = {'user_id': 2, 'iat': time.time() - 60, 'jti': 'a' * 32}
+    assert revocations.is_revoked(claims)
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.buckets import bucket_count, bucket_sequence, GRAINS
+
+
+@pytest.mark.parametrize('grain', GRAINS)
+def test_bucket_count_matches_sequence(grain):
+    first, last = datetime(2023, 11, 29, 22, 30), datetime(2024, 3, 2, 5)
+    assert bucket_count(grain, first, last) == len(bucket_sequence(grain, first, last))
+
+
+def test_long_hourly_range_is_refused(admin_client):
+    response = admin_client.get('/api/reports/reports/trends?group=hour&days=3650')
+    assert response.status_code == 400
+    assert 'at most' in response.get_json()['error']
+
+
+def test_long_monthly_range_is_served(admin_client):
+    response = admin_client.get('/api/reports/reports/trends?group=month&days=3650')
+    assert response.status_code == 200
+    assert 120 <= len(response.get_json()) <= 122
+
+
+def test_huge_days_is_a_bad_request(admin_client):
+    assert admin_client.get('/api/reports/reports/trends?days=99999999999').status_code == 400
@@ -0,0 +1,36 @@
+import pytest
+
+from app import create_app, db
+from app.models import User
+from tests.conftest import TestConfig, login
+
+
+class LocalUserCacheConfig(TestConfig):
+    USER_CACHE_BACKEND = 'local'
+
+
+def test_deactivated_user_loses_access_at_once():
+    app = create_app(LocalUserCacheConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username='staff', email='staff@example.com', role='staff')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+
+        client = login(app.test_client(), 'staff')
+        assert client.get('/api/sales/sales').status_code == 200
+
+        db.session.get(User, user.id).is_active = False
+        db.session.commit()
+        assert client.get('/api/sales/sales').status_code != 200
+        db.session.remove()
+        db.drop_all()
+
+
+def test_local_backend_refused_with_several_workers():
+    class SeveralWorkers(LocalUserCacheConfig):
+        WEB_CONCURRENCY = 4
+
+    with pytest.raises(RuntimeError):
+        create_app(SeveralWorkers)
@@ -0,0 +1,41 @@
+from sqlalchemy import event
+
+from app import db
+from app.models import User
+from app.routes.auth.routes import user_counts
+
+
+def count_statements(client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200
+    return sum('count(' in statement.lower() for statement in statements), response
+
+
+def test_total_is_counted_once_on_the_first_page(admin_client):
+    user_counts._entries.clear()
+    db.session.add_all(User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x')
+                       for i in range(15))
+    db.session.commit()
+
+    counts, response = count_statements(admin_client, '/auth/users')
+    assert counts == 1
+    assert b'About 17 users' in response.data
+    assert count_statements(admin_client, '/auth/users')[0] == 0
+
+    # Later pages never count, and omit the figure once it has expired
+    user_counts._entries.clear()
+    first = admin_client.get('/auth/users')
+    user_counts._entries.clear()
+    cursor = first.data.split(b'cursor=')[1].split(b'&')[0].split(b'"')[0].decode()
+    counts, response = count_statements(admin_client, f'/auth/users?cursor={cursor}')
+    assert counts == 0
+    assert b'About' not in response.data